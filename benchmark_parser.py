@@ -0,0 +1,147 @@
+import io
+import sys
+from contextlib import redirect_stdout
+from statistics import mean, median
+from time import perf_counter
+
+from html_parser import PARSER_BACKENDS, is_parser_available, parse_html
+from http_cache import HttpCache
+from shugiin_hatsugen import\
+    MeetingDetailsPage,\
+    DietMembersPage,\
+    MEETING_SEARCH_RESULTS_STRAINER,\
+    MEETING_DETAILS_STRAINER
+from sangiin_hatsugen import MeetingInfoPage, UpperHouseMembersPage
+from shuisho import ShugiinShuishoClient, SangiinShuishoClient
+
+# キャッシュ済みのページを各パーサーで読み直し、ページ毎の解析時間と
+# ページクラスが取り出す内容が html.parser と一致するかを比べる
+# 部分解析に対応するページは、部分解析した場合の時間も測る
+# 使い方: python benchmark_parser.py [lxml html.parser ...]
+
+BASELINE_PARSER = 'html.parser'
+
+
+def extract_shugiintv(url, soup):
+    if ('u_day=' in url):
+        return [(a.text, a.get('href')) for a in soup.select('td[class="s14_24"] a')]
+    meeting_details_page = MeetingDetailsPage(soup)
+    return (meeting_details_page.topics_list, meeting_details_page.speaker_time_list)
+
+
+def extract_sangiin_meeting(url, soup):
+    meeting_info_page = MeetingInfoPage(url, soup)
+    if (not meeting_info_page.has_contents):
+        return None
+    meeting = meeting_info_page.meeting
+    return (meeting.info.meeting_date, meeting.info.meeting_name, meeting.info.meeting_content,
+            [(speach.name_attr, speach.start_href) for speach in meeting.speaches])
+
+
+def extract_shugiin_members(url, soup):
+    return [diet_member.to_dict() for diet_member in DietMembersPage(soup).diet_members]
+
+
+def extract_sangiin_members(url, soup):
+    return [(member.name, member.name_kana, member.party) for member in UpperHouseMembersPage(soup).members]
+
+
+def extract_shugiin_shuisho(url, soup):
+    return ShugiinShuishoClient().parse_question_page(soup)
+
+
+def extract_sangiin_shuisho(url, soup):
+    return SangiinShuishoClient().parse_questions_page(soup)
+
+
+EXTRACTORS = [
+    ('www.shugiintv.go.jp', extract_shugiintv),
+    ('webtv.sangiin.go.jp/webtv/detail.php', extract_sangiin_meeting),
+    ('itdb_annai.nsf/html/statics/syu/', extract_shugiin_members),
+    ('kousei/giin/', extract_sangiin_members),
+    ('itdb_shitsumon.nsf/html/shitsumon/', extract_shugiin_shuisho),
+    ('kousei/syuisyo/', extract_sangiin_shuisho)
+]
+
+
+def get_extractor(url: str):
+    for url_part, extractor in EXTRACTORS:
+        if (url_part in url):
+            return extractor
+
+
+def get_parse_only(url: str):
+    if ('www.shugiintv.go.jp' not in url):
+        return None
+    if ('u_day=' in url):
+        return MEETING_SEARCH_RESULTS_STRAINER
+    return MEETING_DETAILS_STRAINER
+
+
+def extract(url, soup):
+    try:
+        with redirect_stdout(io.StringIO()):
+            return get_extractor(url)(url, soup)
+    except Exception as e:
+        return ('error', e.__class__.__name__)
+
+
+def load_stored_pages() -> list[tuple[str, bytes]]:
+    http_cache = HttpCache()
+    stored_pages = []
+    for url in http_cache.get_urls():
+        entry = http_cache.lookup(url)
+        if (entry is None or get_extractor(url) is None):
+            continue
+        content = http_cache.read(entry)
+        if (content is not None):
+            stored_pages.append((url, content))
+    return stored_pages
+
+
+def benchmark(parsers: list[str], stored_pages: list[tuple[str, bytes]]) -> dict:
+    results = {}
+    for parser in parsers:
+        results[parser] = benchmark_parser(parser, stored_pages, False)
+    if (any(get_parse_only(url) is not None for url, _ in stored_pages)):
+        for parser in parsers:
+            if (parser != 'html5lib'):
+                results[f'{parser} (部分解析)'] = benchmark_parser(parser, stored_pages, True)
+    return results
+
+
+def benchmark_parser(parser: str, stored_pages: list[tuple[str, bytes]], restricted: bool) -> tuple[list, list]:
+    parse_times = []
+    outputs = []
+    for url, content in stored_pages:
+        parse_only = get_parse_only(url) if restricted else None
+        start = perf_counter()
+        soup = parse_html(content, parser, parse_only)
+        parse_times.append(perf_counter() - start)
+        outputs.append(extract(url, soup))
+    return (parse_times, outputs)
+
+
+def print_report(results: dict, stored_pages: list[tuple[str, bytes]]):
+    baseline_times, baseline_outputs = results[BASELINE_PARSER]
+    print(f'{len(stored_pages)}ページ')
+    for parser, (parse_times, outputs) in results.items():
+        mismatched_urls = [url for (url, _), output, baseline_output in zip(stored_pages, outputs, baseline_outputs)
+                           if output != baseline_output]
+        print(
+            f'{parser}: 平均{mean(parse_times) * 1000:.2f}ms 中央値{median(parse_times) * 1000:.2f}ms '
+            f'合計{sum(parse_times):.2f}s ({sum(baseline_times) / sum(parse_times):.1f}倍) 不一致{len(mismatched_urls)}件')
+        for url in mismatched_urls[:10]:
+            print(f'  {url}')
+
+
+if __name__ == '__main__':
+    parsers = sys.argv[1:] or list(PARSER_BACKENDS.keys())
+    parsers = [parser for parser in parsers if is_parser_available(parser)]
+    if (BASELINE_PARSER not in parsers):
+        parsers.insert(0, BASELINE_PARSER)
+    stored_pages = load_stored_pages()
+    if (not stored_pages):
+        print('キャッシュにページがありません。先に main.py で収集してください。')
+        sys.exit(1)
+    print_report(benchmark(parsers, stored_pages), stored_pages)
@@ -0,0 +1,74 @@
+from collections import deque
+import pandas as pd
+
+# 属性の文字列にブラックリストの語が含まれるかを、Aho-Corasick法で一度の走査で調べる
+# 語の数が増えても1行あたりの手間は文字数に比例するだけで済む
+# 同じ属性は何度も現れるので、異なる値毎に一度だけ調べて結果を使い回す
+
+BLACKLIST_RULE_COLUMN = "ブラックリスト"
+
+
+class BlacklistMatcher:
+    def __init__(self, rules: list[str], version):
+        # 重複した語は最初の1つだけ残す
+        self.rules = list(dict.fromkeys(rule for rule in rules if rule))
+        self.version = version
+        self.__goto: list[dict[str, int]] = [{}]
+        self.__fail: list[int] = [0]
+        # 状態に着いた時点で一致している語のうち、リストで最も前にあるものの番号
+        self.__output: list[int | None] = [None]
+        self.__matches: dict[str, str | None] = {}
+        for rule_index, rule in enumerate(self.rules):
+            self.__add_rule(rule_index, rule)
+        self.__build_fail_links()
+
+    def __add_rule(self, rule_index: int, rule: str):
+        state = 0
+        for char in rule:
+            if (char not in self.__goto[state]):
+                self.__goto.append({})
+                self.__fail.append(0)
+                self.__output.append(None)
+                self.__goto[state][char] = len(self.__goto) - 1
+            state = self.__goto[state][char]
+        if (self.__output[state] is None):
+            self.__output[state] = rule_index
+
+    def __build_fail_links(self):
+        # 浅い状態から順に、失敗時に戻る状態と、そこで一致する語を引き継ぐ
+        queue = deque(self.__goto[0].values())
+        while (queue):
+            state = queue.popleft()
+            for char, next_state in self.__goto[state].items():
+                fail_state = self.__fail[state]
+                while (fail_state and char not in self.__goto[fail_state]):
+                    fail_state = self.__fail[fail_state]
+                self.__fail[next_state] = self.__goto[fail_state].get(char, 0)
+                inherited = self.__output[self.__fail[next_state]]
+                if (inherited is not None and (self.__output[next_state] is None or inherited < self.__output[next_state])):
+                    self.__output[next_state] = inherited
+                queue.append(next_state)
+
+    def match(self, text: str) -> str | None:
+        # 最初に一致した語 (同じ位置で終わる語はリストで前にあるもの)
+        state = 0
+        for char in text:
+            while (state and char not in self.__goto[state]):
+                state = self.__fail[state]
+            state = self.__goto[state].get(char, 0)
+            if (self.__output[state] is not None):
+                return self.rules[self.__output[state]]
+        return None
+
+    def classify(self, values: pd.Series) -> pd.Series:
+        # 一致した語。一致しない行と空の行は None
+        for value in values.dropna().unique():
+            if (value not in self.__matches):
+                self.__matches[value] = self.match(str(value))
+        matched_rules = values.map(self.__matches)
+        return matched_rules.astype(object).where(matched_rules.notna(), None)
+
+    def print_report(self, matched_rules: pd.Series):
+        print(f'ブラックリスト (版 {self.version}) で{matched_rules.notna().sum()}件の発言を分けました。')
+        for rule, count in matched_rules.value_counts().items():
+            print(f'  {rule}: {count}件')
@@ -0,0 +1,88 @@
+import csv
+import json
+import os
+import pandas as pd
+
+from config import CSV_CHUNK_ROWS
+
+# 会議の収集を途中から再開するためのチェックポイント
+# 取得済みの日付・sidと最後に取得したキー(watermark)をmanifestに記録し、
+# 行データはCSVに追記していく
+
+
+class CrawlCheckpoint:
+    def __init__(self, manifest_path: str, rows_path: str):
+        self.manifest_path = manifest_path
+        self.rows_path = rows_path
+        manifest = self.__load_manifest()
+        self.watermark = manifest["watermark"]
+        self.completed = set(manifest["completed"])
+        self.columns: list[str] = manifest["columns"]
+        self.__rows_size: int = manifest["rows_size"]
+        self.__truncate_uncommitted_rows()
+
+    def __load_manifest(self) -> dict:
+        if (os.path.exists(self.manifest_path)):
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        return {
+            "watermark": None,
+            "completed": [],
+            "columns": [],
+            "rows_size": 0
+        }
+
+    def __save_manifest(self):
+        manifest = {
+            "watermark": self.watermark,
+            "completed": sorted(self.completed),
+            "columns": self.columns,
+            "rows_size": self.__rows_size
+        }
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def __truncate_uncommitted_rows(self):
+        # manifestを書き換える前に落ちた場合、その分の行は取り直すので切り捨てる
+        if (os.path.exists(self.rows_path) and os.path.getsize(self.rows_path) > self.__rows_size):
+            with open(self.rows_path, 'r+b') as f:
+                f.truncate(self.__rows_size)
+
+    def is_completed(self, key) -> bool:
+        return key in self.completed
+
+    def commit(self, key, rows: list[dict]):
+        # 記録済みのキーを取り直した場合は行を重複させない
+        if (key in self.completed):
+            return
+        if (rows):
+            self.__append_rows(rows)
+        self.completed.add(key)
+        if (self.watermark is None or key > self.watermark):
+            self.watermark = key
+        self.__save_manifest()
+
+    def __append_rows(self, rows: list[dict]):
+        if (not self.columns):
+            self.columns = list(rows[0].keys())
+        with open(self.rows_path, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.columns)
+            if (self.__rows_size == 0):
+                writer.writeheader()
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+        self.__rows_size = os.path.getsize(self.rows_path)
+
+    def load_rows(self) -> pd.DataFrame:
+        if (self.__rows_size == 0):
+            return pd.DataFrame(columns=self.columns)
+        return pd.read_csv(self.rows_path)
+
+    def iter_rows(self, chunk_rows=CSV_CHUNK_ROWS):
+        # 記録済みの行を chunk_rows 行ずつ読む
+        if (self.__rows_size == 0):
+            return
+        yield from pd.read_csv(self.rows_path, chunksize=chunk_rows)
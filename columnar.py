@@ -0,0 +1,30 @@
+import sys
+import pandas as pd
+
+# 行をdictにせず、列毎のリストに追記していき、最後にそのままDataFrameにする
+# 会議名・氏名のように何度も現れる文字列は intern して同じオブジェクトを共有する
+
+
+class ColumnarBuilder:
+    __slots__ = ('columns', 'interned_columns', '__values')
+
+    def __init__(self, columns: list[str], interned_columns: list[str] | None = None):
+        self.columns = columns
+        self.interned_columns = [column in (interned_columns or []) for column in columns]
+        self.__values: list[list] = [[] for _ in columns]
+
+    def __len__(self) -> int:
+        return len(self.__values[0])
+
+    def append(self, row: tuple):
+        for values, is_interned, value in zip(self.__values, self.interned_columns, row):
+            if (is_interned and type(value) is str):
+                value = sys.intern(value)
+            values.append(value)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def to_df(self) -> pd.DataFrame:
+        return pd.DataFrame(dict(zip(self.columns, self.__values)), columns=self.columns)
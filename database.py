@@ -0,0 +1,265 @@
+import pandas as pd
+from sqlalchemy import\
+    create_engine,\
+    MetaData,\
+    Table,\
+    Column,\
+    Integer,\
+    String,\
+    Text,\
+    Date,\
+    ForeignKey,\
+    UniqueConstraint,\
+    select,\
+    and_
+from sqlalchemy.dialects import mysql, sqlite
+
+from config import\
+    DATABASE_URL,\
+    DATABASE_BATCH_SIZE,\
+    MEETING_TERM
+from dataset_store import dataset_exists, read_dataset
+from houses import SHUGIIN, SANGIIN, get_sangiin_sid
+
+# 収集したデータを正規化してMySQL (ローカルではSQLite) に入れる
+# 各表は自然キーに一意制約を持ち、同じデータを何度入れても行は増えず上書きされる
+# 会議: 院 + 日付 + 委員会名 + sid (衆議院は0)
+# 発言: 会議 + 区分 + 発言者 + その会議で何回目の発言か
+# 主意書: 院 + 国会回次 + 質問番号 / 議員立法: bill_id
+
+metadata = MetaData()
+
+members_table = Table(
+    'members', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('house', String(16), nullable=False),
+    Column('name', String(255), nullable=False),
+    Column('name_kana', String(255)),
+    Column('party', String(255)),
+    UniqueConstraint('house', 'name', name='uq_members_house_name'))
+
+meetings_table = Table(
+    'meetings', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('house', String(16), nullable=False),
+    Column('date', Date, nullable=False),
+    Column('name', String(255), nullable=False),
+    Column('sid', Integer, nullable=False, default=0),
+    Column('content', Text),
+    Column('topics', Text),
+    UniqueConstraint('house', 'date', 'name', 'sid', name='uq_meetings_natural_key'))
+
+speeches_table = Table(
+    'speeches', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('meeting_id', Integer, ForeignKey('meetings.id'), nullable=False),
+    # 'member': 発言者 / 'minister': 大臣等 / 'responder': 答弁者等
+    Column('role', String(16), nullable=False),
+    Column('speaker', String(255), nullable=False),
+    Column('seq', Integer, nullable=False),
+    Column('attributes', String(255)),
+    Column('start_at', String(32)),
+    Column('time_min', Integer),
+    Column('rejected', String(255)),
+    UniqueConstraint('meeting_id', 'role', 'speaker', 'seq', name='uq_speeches_natural_key'))
+
+shuisho_questions_table = Table(
+    'shuisho_questions', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('house', String(16), nullable=False),
+    Column('session', Integer, nullable=False),
+    Column('question_number', Integer, nullable=False),
+    Column('title', Text),
+    Column('submitter', String(255)),
+    UniqueConstraint('house', 'session', 'question_number', name='uq_shuisho_natural_key'))
+
+rippou_bills_table = Table(
+    'rippou_bills', metadata,
+    Column('bill_id', String(64), primary_key=True),
+    Column('house', String(16), nullable=False),
+    Column('session', Integer, nullable=False),
+    Column('number', String(255)),
+    Column('title', Text))
+
+rippou_submitters_table = Table(
+    'rippou_submitters', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('bill_id', String(64), ForeignKey('rippou_bills.bill_id'), nullable=False),
+    Column('seq', Integer, nullable=False),
+    Column('submitter', String(255), nullable=False),
+    UniqueConstraint('bill_id', 'seq', name='uq_rippou_submitters_natural_key'))
+
+
+def to_records(df: pd.DataFrame) -> list[dict]:
+    # NaN・<NA> をNULLにする
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def to_dates(values: pd.Series) -> pd.Series:
+    return pd.to_datetime(values).dt.date
+
+
+class Database:
+    def __init__(self, url=DATABASE_URL, batch_size=DATABASE_BATCH_SIZE):
+        self.engine = create_engine(url, future=True)
+        self.batch_size = batch_size
+        metadata.create_all(self.engine)
+
+    def upsert(self, connection, table: Table, rows: list[dict], key_columns: list[str], update_columns: list[str] | None = None):
+        # 自然キーが重複した行は update_columns を上書きする。空の場合は既存の行をそのまま残す
+        if (not rows):
+            return
+        if (update_columns is None):
+            update_columns = [column for column in rows[0].keys() if column not in key_columns]
+        statement = self.__get_upsert_statement(connection, table, key_columns, update_columns)
+        # 一定の行数毎にexecutemanyでまとめて送る
+        for begin in range(0, len(rows), self.batch_size):
+            connection.execute(statement, rows[begin:begin + self.batch_size])
+
+    def __get_upsert_statement(self, connection, table: Table, key_columns: list[str], update_columns: list[str]):
+        dialect_name = connection.dialect.name
+        if (dialect_name == 'mysql'):
+            statement = mysql.insert(table)
+            if (not update_columns):
+                return statement.prefix_with('IGNORE')
+            return statement.on_duplicate_key_update(
+                {column: statement.inserted[column] for column in update_columns})
+        if (dialect_name == 'sqlite'):
+            statement = sqlite.insert(table)
+            if (not update_columns):
+                return statement.on_conflict_do_nothing(index_elements=key_columns)
+            return statement.on_conflict_do_update(
+                index_elements=key_columns,
+                set_={column: statement.excluded[column] for column in update_columns})
+        raise ValueError(f'{dialect_name} には対応していません。')
+
+    def __get_meeting_ids(self, connection, house: str, meeting_dates: list) -> dict:
+        rows = connection.execute(
+            select(meetings_table.c.id, meetings_table.c.date, meetings_table.c.name, meetings_table.c.sid).where(
+                and_(meetings_table.c.house == house, meetings_table.c.date.in_(meeting_dates)))).fetchall()
+        return {(row.date, row.name, row.sid): row.id for row in rows}
+
+    def __load_speeches(self, connection, house: str, speeches_df: pd.DataFrame):
+        # speeches_df は date, meeting_name, sid, role, speaker と speeches の列を持つ
+        meeting_ids = self.__get_meeting_ids(connection, house, list(speeches_df["date"].unique()))
+        speeches_df = speeches_df.assign(
+            meeting_id=[meeting_ids[key] for key in zip(speeches_df["date"], speeches_df["meeting_name"], speeches_df["sid"])],
+            seq=speeches_df.groupby(["date", "meeting_name", "sid", "role", "speaker"], sort=False).cumcount())
+        speech_columns = [column.name for column in speeches_table.columns
+                          if column.name != 'id' and column.name in speeches_df.columns]
+        self.upsert(connection, speeches_table, to_records(speeches_df[speech_columns]),
+                    ['meeting_id', 'role', 'speaker', 'seq'])
+
+    def load_shugiin_meetings(self, meetings_df: pd.DataFrame):
+        # 発言一覧(衆議院).csv の列
+        meetings_df = meetings_df.assign(date=to_dates(meetings_df["date"]), sid=0)
+        meeting_rows_df = meetings_df.drop_duplicates(["date", "meeting_name"])[["date", "meeting_name", "sid", "topics"]].rename(
+            columns={"meeting_name": "name"})
+        speeches_df = meetings_df.rename(columns={"name": "speaker"}).assign(role='member')
+        with self.engine.begin() as connection:
+            self.upsert(connection, meetings_table, to_records(meeting_rows_df.assign(house=SHUGIIN)),
+                        ['house', 'date', 'name', 'sid'])
+            self.__load_speeches(connection, SHUGIIN, speeches_df)
+
+    def load_shugiin_government_speakers(self, government_speakers_df: pd.DataFrame):
+        # 大臣・答弁者一覧(衆議院).csv の列。発言一覧に無い会議は案件なしで作る
+        government_speakers_df = government_speakers_df.assign(date=to_dates(government_speakers_df["date"]), sid=0)
+        meeting_rows_df = government_speakers_df.drop_duplicates(["date", "meeting_name"])[["date", "meeting_name", "sid"]].rename(
+            columns={"meeting_name": "name"})
+        speeches_df = government_speakers_df.rename(columns={"name": "speaker"})
+        with self.engine.begin() as connection:
+            self.upsert(connection, meetings_table, to_records(meeting_rows_df.assign(house=SHUGIIN)),
+                        ['house', 'date', 'name', 'sid'], update_columns=[])
+            self.__load_speeches(connection, SHUGIIN, speeches_df)
+
+    def load_sangiin_meetings(self, meetings_df: pd.DataFrame):
+        # 発言一覧(参議院).csv の列。meeting_url の無い古いCSVはsidを0とする
+        meetings_df = meetings_df.assign(
+            date=to_dates(meetings_df["meeting_date"]),
+            sid=meetings_df["meeting_url"].map(get_sangiin_sid) if "meeting_url" in meetings_df.columns else 0)
+        meeting_rows_df = meetings_df.drop_duplicates(["date", "meeting_name", "sid"])[
+            ["date", "meeting_name", "sid", "meeting_content"]].rename(
+                columns={"meeting_name": "name", "meeting_content": "content"})
+        speeches_df = meetings_df.rename(columns={"name": "speaker"}).assign(role='member')
+        with self.engine.begin() as connection:
+            self.upsert(connection, meetings_table, to_records(meeting_rows_df.assign(house=SANGIIN)),
+                        ['house', 'date', 'name', 'sid'])
+            self.__load_speeches(connection, SANGIIN, speeches_df)
+
+    def load_members(self, house: str, members_df: pd.DataFrame):
+        # 議員(衆議院).csv は name_kanji、議員(参議院).csv は name に氏名が入っている
+        members_df = members_df.rename(columns={"name_kanji": "name"})
+        member_columns = [column for column in ["name", "name_kana", "party"] if column in members_df.columns]
+        with self.engine.begin() as connection:
+            self.upsert(connection, members_table,
+                        to_records(members_df[member_columns].drop_duplicates("name").assign(house=house)),
+                        ['house', 'name'])
+
+    def load_shuisho_questions(self, house: str, questions_df: pd.DataFrame, session=MEETING_TERM):
+        questions_df = questions_df.rename(columns={
+            "質問番号": "question_number",
+            "質問件名": "title",
+            "件名": "title",
+            "提出者名": "submitter",
+            "提出者": "submitter"})
+        with self.engine.begin() as connection:
+            self.upsert(connection, shuisho_questions_table,
+                        to_records(questions_df[["question_number", "title", "submitter"]].assign(
+                            house=house, session=session)),
+                        ['house', 'session', 'question_number'])
+
+    def load_rippou_bills(self, house: str, bills_df: pd.DataFrame, session=MEETING_TERM):
+        # 議員立法の行は1法案につき提出者の数だけある
+        bills_df = bills_df.rename(columns={
+            "提出番号": "number",
+            "法律案名": "title",
+            "提出者": "submitter"}).assign(bill_id=lambda df: df["bill_id"].astype(str))
+        bill_rows_df = bills_df.drop_duplicates("bill_id")[["bill_id", "number", "title"]].assign(
+            house=house, session=session)
+        submitter_rows_df = bills_df.assign(seq=bills_df.groupby("bill_id", sort=False).cumcount())[
+            ["bill_id", "seq", "submitter"]]
+        with self.engine.begin() as connection:
+            self.upsert(connection, rippou_bills_table, to_records(bill_rows_df), ['bill_id'])
+            self.upsert(connection, rippou_submitters_table, to_records(submitter_rows_df), ['bill_id', 'seq'])
+
+    def load_datasets(self):
+        # 出力済みの中間データをすべて読み込む。無いデータは飛ばす
+        dataset_loaders = [
+            ('shugiin_members', lambda df: self.load_members(SHUGIIN, df)),
+            ('sangiin_members', lambda df: self.load_members(SANGIIN, df)),
+            ('shugiin_meetings', self.load_shugiin_meetings),
+            ('shugiin_government_speakers', self.load_shugiin_government_speakers),
+            ('sangiin_meetings', self.load_sangiin_meetings),
+            ('shugiin_shuisho', lambda df: self.load_shuisho_questions(SHUGIIN, df)),
+            ('sangiin_shuisho', lambda df: self.load_shuisho_questions(SANGIIN, df)),
+            ('shugiin_rippou', lambda df: self.load_rippou_bills(SHUGIIN, df)),
+            ('sangiin_rippou', lambda df: self.load_rippou_bills(SANGIIN, df))
+        ]
+        for name, load in dataset_loaders:
+            if (dataset_exists(name)):
+                print(f'{name} を読み込み中')
+                load(read_dataset(name))
+
+    def query_speeches(self, house: str | None = None, speaker: str | None = None,
+                       date_from=None, date_to=None) -> pd.DataFrame:
+        # 複数の国会にまたがる発言をCSVを読まずに取り出す
+        query = select(
+            meetings_table.c.house,
+            meetings_table.c.date,
+            meetings_table.c.name.label('meeting_name'),
+            speeches_table.c.role,
+            speeches_table.c.speaker,
+            speeches_table.c.attributes,
+            speeches_table.c.time_min).select_from(
+                speeches_table.join(meetings_table, speeches_table.c.meeting_id == meetings_table.c.id)).order_by(
+                    meetings_table.c.date, speeches_table.c.id)
+        if (house):
+            query = query.where(meetings_table.c.house == house)
+        if (speaker):
+            query = query.where(speeches_table.c.speaker == speaker)
+        if (date_from):
+            query = query.where(meetings_table.c.date >= date_from)
+        if (date_to):
+            query = query.where(meetings_table.c.date <= date_to)
+        with self.engine.connect() as connection:
+            return pd.DataFrame(connection.execute(query).mappings().all(), columns=list(query.selected_columns.keys()))
@@ -0,0 +1,213 @@
+import os
+from functools import lru_cache
+from importlib.util import find_spec
+import pandas as pd
+
+from config import\
+    INTERMEDIATE_FORMAT,\
+    EXPORT_CSV,\
+    SHUGIIN_MEETING_CSV,\
+    SHUGIIN_GOVERNMENT_SPEAKERS_CSV,\
+    SHUGIIN_MEMBERS_CSV,\
+    SHUGIIN_SHUISHO_CSV,\
+    SHUGIIN_RIPPOU_CSV,\
+    SANGIIN_MEETING_CSV,\
+    SANGIIN_MEMBERS_CSV,\
+    SANGIIN_SHUISHO_CSV,\
+    SANGIIN_RIPPOU_CSV
+from row_sink import ChunkedRowSink, CsvChunkWriter
+
+# 収集から納品ファイル生成までの中間データ
+# データセット毎に列と型を決めておき、Arrow IPC (Feather v2) ファイルに書く
+# 読む時はメモリマップしたファイルから必要な列だけを取り出す
+# pyarrow が無い場合や INTERMEDIATE_FORMAT = 'csv' の場合はCSVを使い、読む時に同じ型に揃える
+
+ARROW_EXTENSION = '.arrow'
+
+# 列の型は 'string' / 'int' / 'date'
+DATASET_SCHEMAS = {
+    'shugiin_meetings': (SHUGIIN_MEETING_CSV, {
+        'meeting_name': 'string',
+        'date': 'date',
+        'name': 'string',
+        'attributes': 'string',
+        'time_min': 'int',
+        'topics': 'string',
+        'rejected': 'string'
+    }),
+    'shugiin_government_speakers': (SHUGIIN_GOVERNMENT_SPEAKERS_CSV, {
+        'meeting_name': 'string',
+        'date': 'date',
+        'role': 'string',
+        'name': 'string',
+        'attributes': 'string',
+        'start_at': 'string',
+        'time': 'string',
+        'time_min': 'int'
+    }),
+    'shugiin_members': (SHUGIIN_MEMBERS_CSV, {
+        'name_kanji': 'string',
+        'name_kana': 'string',
+        'party': 'string'
+    }),
+    'shugiin_shuisho': (SHUGIIN_SHUISHO_CSV, {
+        '質問番号': 'int',
+        '質問件名': 'string',
+        '提出者名': 'string'
+    }),
+    'shugiin_rippou': (SHUGIIN_RIPPOU_CSV, {
+        'bill_id': 'string',
+        '提出番号': 'string',
+        '法律案名': 'string',
+        '提出者': 'string'
+    }),
+    'sangiin_meetings': (SANGIIN_MEETING_CSV, {
+        'meeting_date': 'date',
+        'meeting_name': 'string',
+        'meeting_content': 'string',
+        'name': 'string',
+        'attributes': 'string',
+        'time_min': 'int',
+        'meeting_url': 'string',
+        'rejected': 'string'
+    }),
+    'sangiin_members': (SANGIIN_MEMBERS_CSV, {
+        'name': 'string',
+        'name_kana': 'string',
+        'party': 'string'
+    }),
+    'sangiin_shuisho': (SANGIIN_SHUISHO_CSV, {
+        '質問番号': 'int',
+        '件名': 'string',
+        '提出者': 'string'
+    }),
+    'sangiin_rippou': (SANGIIN_RIPPOU_CSV, {
+        'bill_id': 'string',
+        '提出番号': 'string',
+        '法律案名': 'string',
+        '提出者': 'string'
+    })
+}
+
+
+@lru_cache(maxsize=None)
+def is_arrow_enabled(intermediate_format: str = INTERMEDIATE_FORMAT) -> bool:
+    if (intermediate_format != 'arrow'):
+        return False
+    if (find_spec('pyarrow') is not None):
+        return True
+    print('pyarrow がインストールされていないため中間データにCSVを使います。')
+    return False
+
+
+def get_columns(name: str) -> list[str]:
+    return list(DATASET_SCHEMAS[name][1].keys())
+
+
+def get_csv_path(name: str) -> str:
+    return DATASET_SCHEMAS[name][0]
+
+
+def get_arrow_path(name: str) -> str:
+    return os.path.splitext(get_csv_path(name))[0] + ARROW_EXTENSION
+
+
+def get_arrow_schema(name: str):
+    import pyarrow as pa
+    arrow_types = {
+        'string': pa.string(),
+        'int': pa.int64(),
+        'date': pa.date32()
+    }
+    return pa.schema([(column, arrow_types[column_type]) for column, column_type in DATASET_SCHEMAS[name][1].items()])
+
+
+def to_schema(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    # 足りない列は空で埋め、余分な列は落として、列の型をスキーマに揃える
+    converted_df = df.reindex(columns=get_columns(name))
+    for column, column_type in DATASET_SCHEMAS[name][1].items():
+        values = converted_df[column]
+        if (column_type == 'date'):
+            converted_df[column] = pd.to_datetime(values).dt.date
+        elif (column_type == 'int'):
+            converted_df[column] = pd.to_numeric(values).astype('Int64')
+        else:
+            converted_df[column] = values.astype(object).where(values.notna(), None).map(
+                lambda value: value if value is None else str(value))
+    return converted_df.reset_index(drop=True)
+
+
+def to_arrow_table(name: str, df: pd.DataFrame):
+    import pyarrow as pa
+    return pa.Table.from_pandas(to_schema(name, df), schema=get_arrow_schema(name), preserve_index=False)
+
+
+class ArrowChunkWriter:
+    # 書き終えるまでは一時ファイルに書き、閉じた時に置き換える
+    def __init__(self, name: str):
+        self.name = name
+        self.path = get_arrow_path(name)
+        self.__tmp_path = self.path + '.tmp'
+        self.__writer = None
+
+    def write(self, chunk_df: pd.DataFrame):
+        import pyarrow as pa
+        if (self.__writer is None):
+            self.__writer = pa.ipc.new_file(self.__tmp_path, get_arrow_schema(self.name))
+        self.__writer.write_table(to_arrow_table(self.name, chunk_df))
+
+    def close(self):
+        if (self.__writer is None):
+            return
+        self.__writer.close()
+        os.replace(self.__tmp_path, self.path)
+
+
+def get_writers(name: str) -> list:
+    writers = []
+    if (is_arrow_enabled()):
+        writers.append(ArrowChunkWriter(name))
+    # 中間データがCSVの場合と、CSVも書き出す場合
+    if (EXPORT_CSV or not is_arrow_enabled()):
+        writers.append(CsvChunkWriter(get_csv_path(name)))
+    return writers
+
+
+def write_dataset(name: str, df: pd.DataFrame, extra_writers: list | None = None):
+    df = to_schema(name, df)
+    for writer in get_writers(name) + (extra_writers or []):
+        writer.write(df)
+        writer.close()
+
+
+def open_dataset_sink(name: str, columns: list[str], transform=None, group_column: str | None = None,
+                      extra_writers: list | None = None) -> ChunkedRowSink:
+    # columns は受け取る行の列。transform した結果がこのデータセットの列になる
+    # extra_writers には索引など、中間データと同じチャンクを受け取る書き出し先を渡す
+    return ChunkedRowSink(columns, get_writers(name) + (extra_writers or []), transform, group_column)
+
+
+def dataset_exists(name: str) -> bool:
+    if (is_arrow_enabled() and os.path.exists(get_arrow_path(name))):
+        return True
+    return os.path.exists(get_csv_path(name))
+
+
+def read_arrow_table(name: str, columns: list[str] | None = None):
+    # ファイルをメモリマップし、レコードバッチはコピーせずにそのまま参照する
+    import pyarrow as pa
+    with pa.memory_map(get_arrow_path(name)) as source:
+        table = pa.ipc.open_file(source).read_all()
+    if (columns is not None):
+        table = table.select(columns)
+    return table
+
+
+def read_dataset(name: str, columns: list[str] | None = None) -> pd.DataFrame:
+    if (is_arrow_enabled() and os.path.exists(get_arrow_path(name))):
+        import pyarrow as pa
+        return read_arrow_table(name, columns).to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+    df = to_schema(name, pd.read_csv(get_csv_path(name), index_col=0))
+    if (columns is not None):
+        return df[columns]
+    return df
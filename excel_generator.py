@@ -1,75 +1,63 @@
+import os
 import pandas as pd
+from dataset_store import read_dataset
+from houses import SHUGIIN, SANGIIN
+from search_index import SearchIndex
+from member_index import MemberIndex, MEMBER_ID_COLUMN
+from excel_writer import open_excel_writer
+from blacklist import BlacklistMatcher, BLACKLIST_RULE_COLUMN
 from config import\
-    SHUGIIN_MEETING_CSV,\
-    SHUGIIN_RIPPOU_CSV,\
-    SHUGIIN_SHUISHO_CSV,\
-    SHUGIIN_MEMBERS_CSV,\
-    SANGIIN_MEETING_CSV,\
-    SANGIIN_RIPPOU_CSV,\
-    SANGIIN_SHUISHO_CSV,\
-    SANGIIN_MEMBERS_CSV
+    EXCEL_ROLLUP_SHEET,\
+    SEARCH_INDEX_PATH,\
+    BLACKLIST_VERSION,\
+    SHUGIIN_BLACKLIST,\
+    SANGIIN_BLACKLIST
 
 class ShugiinExcelGenerator:
     def __init__(self):
-        self.shugiin_meeting_df = pd.read_csv(SHUGIIN_MEETING_CSV)
-        self.shugiin_members_df = pd.read_csv(SHUGIIN_MEMBERS_CSV)
-        self.shugiin_shuisho_df = self.drop_unnamed(pd.read_csv(SHUGIIN_SHUISHO_CSV))
-        self.shugiin_rippou_df = self.drop_unnamed(pd.read_csv(SHUGIIN_RIPPOU_CSV))
+        self.shugiin_meeting_df = read_dataset('shugiin_meetings')
+        self.shugiin_members_df = read_dataset('shugiin_members')
+        self.shugiin_shuisho_df = read_dataset('shugiin_shuisho')
+        self.shugiin_rippou_df = read_dataset('shugiin_rippou')
+        self.member_index = MemberIndex(self.shugiin_members_df, "name_kanji")
+        self.blacklist = BlacklistMatcher(SHUGIIN_BLACKLIST, BLACKLIST_VERSION)
 
     def generate(self, filename):
         meetings_with_members_df = self.merge_meeting_members_df(
             self.shugiin_meeting_df, self.shugiin_members_df)
-        passed_meetings_df, filtered_meetings_df = self.filter_blacklist(meetings_with_members_df)
+        meetings_with_members_df[BLACKLIST_RULE_COLUMN] = self.classify_blacklist(meetings_with_members_df)
+        blacklisted = meetings_with_members_df[BLACKLIST_RULE_COLUMN].notna()
+        self.blacklist.print_report(meetings_with_members_df[BLACKLIST_RULE_COLUMN])
+        self.member_index.get_member_ids(self.shugiin_shuisho_df["提出者名"], "主意書(衆議院)")
+        self.member_index.get_member_ids(self.shugiin_rippou_df["提出者"], "議員立法(衆議院)")
+        self.member_index.print_report()
+        member_time_totals_df = get_member_time_totals_df(SHUGIIN, self.shugiin_meeting_df["date"])
 
-        with pd.ExcelWriter(filename) as writer:
-            self.shugiin_shuisho_df.to_excel(writer, sheet_name="⑦主意書")
-            self.shugiin_rippou_df.to_excel(writer, sheet_name="⑥議員立法")
-            passed_meetings_df.to_excel(writer, sheet_name="⑤③からブラックリストを弾いた最終データ")
-            filtered_meetings_df.to_excel(writer, sheet_name="④③のうちブラックリストから抽出された発言")
-            meetings_with_members_df.to_excel(writer, sheet_name="③会議発言①と衆議院議員②を結合")
-            self.shugiin_members_df.to_excel(writer, sheet_name="②元データ・衆議院議員")
-            self.shugiin_meeting_df.to_excel(writer, sheet_name="①元データ・会議発言")
+        # ④⑤は③の行を絞り込みながら書き、コピーを作らない
+        with open_excel_writer(filename) as writer:
+            if (member_time_totals_df is not None):
+                writer.write_df(member_time_totals_df, "⑧議員別発言時間")
+            writer.write_df(self.shugiin_shuisho_df, "⑦主意書")
+            writer.write_df(self.shugiin_rippou_df, "⑥議員立法")
+            writer.write_df(meetings_with_members_df, "⑤③からブラックリストを弾いた最終データ", ~blacklisted,
+                            meetings_with_members_df.columns.drop(BLACKLIST_RULE_COLUMN))
+            writer.write_df(meetings_with_members_df, "④③のうちブラックリストから抽出された発言", blacklisted)
+            writer.write_df(meetings_with_members_df, "③会議発言①と衆議院議員②を結合")
+            writer.write_df(self.shugiin_members_df, "②元データ・衆議院議員")
+            writer.write_df(self.shugiin_meeting_df, "①元データ・会議発言")
 
-    def drop_unnamed(self, df):
-        return df.drop(
-            columns=["Unnamed: 0"])
-
-    def filter_blacklist(self, meetings_with_members_df):
-        passed = meetings_with_members_df[
-            ~meetings_with_members_df["属性"].str.contains(self.__get_blacklist_str())]
-        filtered = meetings_with_members_df[
-            meetings_with_members_df["属性"].str.contains(self.__get_blacklist_str())]
-        return (passed, filtered)
-
-    def __get_blacklist_str(self):
-        blacklist = [
-            "委員長",
-            "大臣",
-            "議長",
-            "委員長",
-            "会長",
-            "主査",
-            "長官",
-            "担当",
-            "参考人",
-            "公述人",
-            "局長",
-            "採決",
-            "総裁",
-            "ウクライナ大統領",
-            "日本弁護士連合会",
-            "参議院"]
-        return "|".join(blacklist)
+    def classify_blacklist(self, meetings_with_members_df):
+        # 属性に一致したブラックリストの語。一致しない行は None
+        return self.blacklist.classify(meetings_with_members_df["属性"])
 
     def merge_meeting_members_df(self, shugiin_meeting_df, shugiin_members_df):
+        # 名前を揃えて引いた議員IDで結合する
         return pd.merge(
-            shugiin_meeting_df,
-            shugiin_members_df,
-            left_on="name",
-            right_on="name_kanji",
+            shugiin_meeting_df.assign(**{
+                MEMBER_ID_COLUMN: self.member_index.get_member_ids(shugiin_meeting_df["name"], "発言一覧(衆議院)")}),
+            self.member_index.get_members_by_id(shugiin_members_df),
+            on=MEMBER_ID_COLUMN,
             how='left'
-            ).drop(
-            columns=["name_kanji", "Unnamed: 0_x", "Unnamed: 0_y"]
             ).reindex(
             columns=['date', 'meeting_name', 'name', 'name_kana', 'party', 'time_min', 'topics', 'attributes']
             ).rename(
@@ -87,62 +75,49 @@ class ShugiinExcelGenerator:
 
 class SangiinExcelGenerator:
     def __init__(self):
-        self.sangiin_meeting_df = pd.read_csv(SANGIIN_MEETING_CSV)
-        self.sangiin_members_df = pd.read_csv(SANGIIN_MEMBERS_CSV)
-        self.sangiin_shuisho_df = self.drop_unnamed(pd.read_csv(SANGIIN_SHUISHO_CSV))
-        self.sangiin_rippou_df = self.drop_unnamed(pd.read_csv(SANGIIN_RIPPOU_CSV))
+        self.sangiin_meeting_df = read_dataset('sangiin_meetings')
+        self.sangiin_members_df = read_dataset('sangiin_members')
+        self.sangiin_shuisho_df = read_dataset('sangiin_shuisho')
+        self.sangiin_rippou_df = read_dataset('sangiin_rippou')
+        self.member_index = MemberIndex(self.sangiin_members_df, "name")
+        self.blacklist = BlacklistMatcher(SANGIIN_BLACKLIST, BLACKLIST_VERSION)
 
     def generate(self, filename):
         meetings_with_members_df = self.merge_meeting_members_df(
             self.sangiin_meeting_df, self.sangiin_members_df)
-        passed_meetings_df, filtered_meetings_df = self.filter_blacklist(meetings_with_members_df)
-
-        with pd.ExcelWriter(filename) as writer:
-            self.sangiin_shuisho_df.to_excel(writer, sheet_name="⑦主意書")
-            self.sangiin_rippou_df.to_excel(writer, sheet_name="⑥議員立法")
-            passed_meetings_df.to_excel(writer, sheet_name="⑤③からブラックリストを弾いた最終データ")
-            filtered_meetings_df.to_excel(writer, sheet_name="④③のうちブラックリストから抽出された発言")
-            meetings_with_members_df.to_excel(writer, sheet_name="③会議発言①と衆議院議員②を結合")
-            self.sangiin_members_df.to_excel(writer, sheet_name="②元データ・衆議院議員")
-            self.sangiin_meeting_df.to_excel(writer, sheet_name="①元データ・会議発言")
-
-    def drop_unnamed(self, df):
-        return df.drop(
-            columns=["Unnamed: 0"])
+        meetings_with_members_df[BLACKLIST_RULE_COLUMN] = self.classify_blacklist(meetings_with_members_df)
+        blacklisted = meetings_with_members_df[BLACKLIST_RULE_COLUMN].notna()
+        self.blacklist.print_report(meetings_with_members_df[BLACKLIST_RULE_COLUMN])
+        self.member_index.get_member_ids(self.sangiin_shuisho_df["提出者"], "主意書(参議院)")
+        self.member_index.get_member_ids(self.sangiin_rippou_df["提出者"], "議員立法(参議院)")
+        self.member_index.print_report()
+        member_time_totals_df = get_member_time_totals_df(SANGIIN, self.sangiin_meeting_df["meeting_date"])
 
-    def filter_blacklist(self, meetings_with_members_df):
-        passed = meetings_with_members_df[
-            ~meetings_with_members_df["属性"].str.contains(self.__get_blacklist_str())]
-        filtered = meetings_with_members_df[
-            meetings_with_members_df["属性"].str.contains(self.__get_blacklist_str())]
-        return (passed, filtered)
+        # ④⑤は③の行を絞り込みながら書き、コピーを作らない
+        with open_excel_writer(filename) as writer:
+            if (member_time_totals_df is not None):
+                writer.write_df(member_time_totals_df, "⑧議員別発言時間")
+            writer.write_df(self.sangiin_shuisho_df, "⑦主意書")
+            writer.write_df(self.sangiin_rippou_df, "⑥議員立法")
+            writer.write_df(meetings_with_members_df, "⑤③からブラックリストを弾いた最終データ", ~blacklisted,
+                            meetings_with_members_df.columns.drop(BLACKLIST_RULE_COLUMN))
+            writer.write_df(meetings_with_members_df, "④③のうちブラックリストから抽出された発言", blacklisted)
+            writer.write_df(meetings_with_members_df, "③会議発言①と衆議院議員②を結合")
+            writer.write_df(self.sangiin_members_df, "②元データ・衆議院議員")
+            writer.write_df(self.sangiin_meeting_df, "①元データ・会議発言")
 
-    def __get_blacklist_str(self):
-        blacklist = [
-            "委員長",
-            "大臣",
-            "議長",
-            "委員長",
-            "参考人",
-            "総裁",
-            "公述人",
-            "長官",
-            "総長",
-            "局長",
-            "院長",
-            "会長",
-            "衆議院議員"]
-        return "|".join(blacklist)
+    def classify_blacklist(self, meetings_with_members_df):
+        # 属性に一致したブラックリストの語。一致しない行は None
+        return self.blacklist.classify(meetings_with_members_df["属性"])
 
     def merge_meeting_members_df(self, sangiin_meeting_df, sangiin_members_df):
+        # 名前を揃えて引いた議員IDで結合する
         return pd.merge(
-            sangiin_meeting_df,
-            sangiin_members_df,
-            left_on="name",
-            right_on="name",
+            sangiin_meeting_df.assign(**{
+                MEMBER_ID_COLUMN: self.member_index.get_member_ids(sangiin_meeting_df["name"], "発言一覧(参議院)")}),
+            self.member_index.get_members_by_id(sangiin_members_df),
+            on=MEMBER_ID_COLUMN,
             how='left'
-            ).drop(
-            columns=["Unnamed: 0_x", "Unnamed: 0_y"]
             ).reindex(
             columns=['meeting_date', 'meeting_name', 'name', 'name_kana', 'time_min', 'meeting_content', 'attributes']
             ).rename(columns={
@@ -154,4 +129,32 @@ class SangiinExcelGenerator:
                 "attributes": "属性",
                 "time_min": "時間"}
             ).reset_index(
-            drop=True)
\ No newline at end of file
+            drop=True)
+
+def get_member_time_totals_df(house: str, meeting_dates: pd.Series) -> pd.DataFrame | None:
+    # 全文検索索引の集計表から、発言一覧と同じ期間の議員別の合計を読む (発言の行は数え直さない)
+    if (not EXCEL_ROLLUP_SHEET or not os.path.exists(SEARCH_INDEX_PATH)):
+        return None
+    meeting_dates = meeting_dates.dropna()
+    search_index = SearchIndex()
+    try:
+        totals_df = search_index.rollups.get_totals(
+            'member', house,
+            meeting_dates.min() if len(meeting_dates) else None,
+            meeting_dates.max() if len(meeting_dates) else None)
+    finally:
+        search_index.close()
+    return totals_df.reindex(
+        columns=['speaker', 'party', 'speeches', 'time_min']
+        ).rename(columns={
+            "speaker": "議員名",
+            "party": "政党",
+            "speeches": "発言数",
+            "time_min": "時間"})
+
+
+def generate_excel(is_shugiin: bool, filename: str):
+    # 院毎に別のプロセスで呼べるよう、生成器の作成から書き出しまでをまとめる
+    excel_generator = ShugiinExcelGenerator() if is_shugiin else SangiinExcelGenerator()
+    excel_generator.generate(filename)
+    return filename
@@ -0,0 +1,60 @@
+import pandas as pd
+from openpyxl import Workbook
+
+from config import EXCEL_WRITE_ONLY, EXCEL_CHUNK_ROWS
+
+# 納品ファイルの書き出し
+# write_only の場合はopenpyxlの書き込み専用ブックに、シート毎にchunk_rows行ずつ流し込む
+# 書き込んだ行はメモリに残らないので、行数が増えても使用メモリはほぼ一定になる
+# シートの見た目は DataFrame.to_excel と同じく、先頭の列にインデックス、先頭の行に列名を置く
+
+
+class PandasExcelWriter:
+    def __init__(self, filename: str):
+        self.__writer = pd.ExcelWriter(filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__writer.close()
+
+    def write_df(self, df: pd.DataFrame, sheet_name: str, mask: pd.Series | None = None, columns: list | None = None):
+        df = df if columns is None else df[columns]
+        (df if mask is None else df[mask]).to_excel(self.__writer, sheet_name=sheet_name)
+
+
+class StreamingExcelWriter:
+    def __init__(self, filename: str, chunk_rows=EXCEL_CHUNK_ROWS):
+        self.filename = filename
+        self.chunk_rows = chunk_rows
+        self.__workbook = Workbook(write_only=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if (exc_type is None):
+            self.__workbook.save(self.filename)
+        self.__workbook.close()
+
+    def write_df(self, df: pd.DataFrame, sheet_name: str, mask: pd.Series | None = None, columns: list | None = None):
+        # mask を渡すと、True の行だけを元のインデックスのまま書く (絞り込んだコピーは作らない)
+        # columns を渡すと、その列だけを書く
+        columns = list(df.columns) if columns is None else columns
+        sheet = self.__workbook.create_sheet(sheet_name)
+        sheet.append([None] + [str(column) for column in columns])
+        for begin in range(0, len(df), self.chunk_rows):
+            chunk_df = df.iloc[begin:begin + self.chunk_rows][columns]
+            if (mask is not None):
+                chunk_df = chunk_df[mask.iloc[begin:begin + self.chunk_rows].to_numpy()]
+            # NaN・<NA> は空のセルにする
+            chunk_df = chunk_df.astype(object).where(chunk_df.notna(), None)
+            for row in chunk_df.itertuples(name=None):
+                sheet.append(row)
+
+
+def open_excel_writer(filename: str, write_only=EXCEL_WRITE_ONLY):
+    if (write_only):
+        return StreamingExcelWriter(filename)
+    return PandasExcelWriter(filename)
@@ -1,56 +1,236 @@
-import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 import json
-from selenium.webdriver import Chrome
-from time import sleep
-from selenium.webdriver.chrome.options import Options
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+from threading import Thread, Lock
 
-from config import MEETING_TERM
+from config import\
+    MEETING_TERM,\
+    RIPPOU_MAX_WORKERS,\
+    RIPPOU_USE_BROWSER,\
+    RIPPOU_BROWSER_POOL_SIZE,\
+    RIPPOU_BROWSER_READY_TIMEOUT,\
+    RIPPOU_BROWSER_MAX_ATTEMPTS,\
+    RIPPOU_BILL_DETAIL_SAMPLE
+from http_client import get_page
+from html_parser import parse_html
 
 URL_BASE = 'https://hourei.ndl.go.jp/law/api/v1/search/detail?'
 PER_PAGE = 100
 SHUGIIN_PARAM = f'fw=&fwc=and&bill.t1=false&bill.t2=true&bill.t3=false&bill.t4=false&bill.t11=false&bill.t12=false&bill.t13=false&bill.t14=false&bill.t1516=false&bill.tef=5&bill.tper=range&bill.tet=5&bill.tdcf=1&bill.tsf={MEETING_TERM}&bill.tsp=range&bill.tdct=1&bill.epef=5&bill.epp=range&bill.epet=5&bill.ptp=false&bill.discussList[0].sd=1&bill.discussList[0].ode=5&bill.bdin=false&bill.bdr=false&bill.bda=false&bill.bde=false&bill.adef=5&bill.adp=range&bill.adet=5&bill.adf=1&bill.asp=range&bill.adt=1&bill.epe=5&type=&div=&order=1&perpage={PER_PAGE}'
 SANGIIN_PARAM = f'fw=&fwc=and&bill.t1=false&bill.t2=false&bill.t3=true&bill.t4=false&bill.t11=false&bill.t12=false&bill.t13=false&bill.t14=false&bill.t1516=false&bill.tef=5&bill.tper=range&bill.tet=5&bill.tdcf=1&bill.tsf={MEETING_TERM}&bill.tsp=range&bill.tdct=1&bill.epef=5&bill.epp=range&bill.epet=5&bill.ptp=false&bill.discussList%5B0%5D.sd=1&bill.discussList%5B0%5D.ode=5&bill.bdin=false&bill.bdr=false&bill.bda=false&bill.bde=false&bill.adef=5&bill.adp=range&bill.adet=5&bill.adf=1&bill.asp=range&bill.adt=1&bill.epe=5&type=&div=&order=1&perpage={PER_PAGE}'
 
+BILL_DETAIL_URL_BASE = 'https://hourei.ndl.go.jp/law/api/v1/bill/detail?billId='
+BILL_PAGE_URL_BASE = 'https://hourei.ndl.go.jp/#/detail?billId='
+# 詳細APIの項目名 (画面上の 法律案名・提出回次/番号・提出者・提出者(その他) に対応する)
+# 項目名は RIPPOU_BILL_DETAIL_SAMPLE の見本に合わせ、変える場合は見本も取り直す
+BILL_TITLE_KEY = 'bill_name'
+BILL_NUMBER_KEY = 'bill_number'
+BILL_SUBMITTER_KEY = 'submitter'
+BILL_OTHER_SUBMITTERS_KEY = 'other_submitters'
+# 応答にこれらの項目が無い場合は、項目名が変わったものとしてブラウザで開く
+BILL_REQUIRED_KEYS = [BILL_TITLE_KEY, BILL_NUMBER_KEY, BILL_SUBMITTER_KEY, BILL_OTHER_SUBMITTERS_KEY]
+# 法案ページで提出者が入るliの位置と、parse_bill_page が読む最後のliの位置
+SUBMITTER_LI_INDEX = 12
+LAST_LI_INDEX = 14
+
+
+class BillPageBrowserPool:
+    # JavaScriptで描画される法案ページを複数のheadlessブラウザで並列に開く
+    def __init__(self, pool_size=RIPPOU_BROWSER_POOL_SIZE, ready_timeout=RIPPOU_BROWSER_READY_TIMEOUT,
+                 max_attempts=RIPPOU_BROWSER_MAX_ATTEMPTS):
+        self.pool_size = pool_size
+        self.ready_timeout = ready_timeout
+        self.max_attempts = max_attempts
+        self.__lock = Lock()
+
+    def __create_driver(self):
+        from selenium.webdriver import Chrome
+        from selenium.webdriver.chrome.options import Options
+        options = Options()
+        options.add_argument('--headless')
+        driver = Chrome(options=options)
+        driver.set_page_load_timeout(self.ready_timeout)
+        return driver
+
+    def __quit_driver(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def __is_submitters_ready(self, driver) -> bool:
+        # 解析で読む最後のliまであり、提出者のliに中身が入っていれば描画済みとみなす
+        from selenium.webdriver.common.by import By
+        li_list = driver.find_elements(By.TAG_NAME, 'li')
+        return len(li_list) > LAST_LI_INDEX and li_list[SUBMITTER_LI_INDEX].text.strip() != ''
+
+    def download_pages(self, bill_ids) -> dict:
+        bill_queue = Queue()
+        for bill_id in bill_ids:
+            bill_queue.put((bill_id, 1))
+        bill_pages = {}
+        workers = [Thread(target=self.__work, args=(bill_queue, bill_pages))
+                   for _ in range(min(self.pool_size, len(bill_ids)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return bill_pages
+
+    def __work(self, bill_queue: Queue, bill_pages: dict):
+        from selenium.common.exceptions import WebDriverException
+        from selenium.webdriver.support.ui import WebDriverWait
+        driver = self.__create_driver()
+        try:
+            while (True):
+                try:
+                    bill_id, attempt = bill_queue.get_nowait()
+                except Empty:
+                    break
+                print(f'{BILL_PAGE_URL_BASE}{bill_id} の情報を取得中')
+                try:
+                    driver.get(f'{BILL_PAGE_URL_BASE}{bill_id}')
+                    WebDriverWait(driver, self.ready_timeout).until(self.__is_submitters_ready)
+                    bill_page = driver.page_source.encode('utf-8')
+                except WebDriverException:
+                    # 応答しなくなったブラウザは作り直してから再試行する
+                    self.__quit_driver(driver)
+                    driver = self.__create_driver()
+                    if (attempt < self.max_attempts):
+                        bill_queue.put((bill_id, attempt + 1))
+                    else:
+                        print(f'{BILL_PAGE_URL_BASE}{bill_id} を取得できませんでした。')
+                    continue
+                with self.__lock:
+                    bill_pages[bill_id] = bill_page
+        finally:
+            self.__quit_driver(driver)
+
 class GiinRippouClient:
     def __init__(self, is_shugiin):
         if (is_shugiin):
             self.url_base = URL_BASE + SHUGIIN_PARAM
         else:
             self.url_base = URL_BASE + SANGIIN_PARAM
-
-        self.options = Options()
-        self.options.add_argument('--headless')
+        # ブラウザでも取得できなかった法案。結果には含めず、main で報告する
+        self.failed_bill_ids = []
+        # 詳細APIから取得できず、ブラウザで開いた法案の件数
+        self.browser_bill_count = 0
 
     def generate_page_df(self):
-        search_page_data_list = self.download_search_pages()
-        bill_ids = self.get_bill_ids(search_page_data_list)
-        submitters_info_list = self.download_submitters_info(bill_ids)
+        bill_ids, submitters_info_by_bill = self.stream_submitters_info()
+        submitters_info_list = self.complete_submitters_info_by_browser(bill_ids, submitters_info_by_bill)
         return pd.DataFrame(submitters_info_list)
 
-    def download_submitters_info(self, bill_ids):
+    def stream_submitters_info(self) -> tuple[list, list]:
+        # 検索ページが1ページ届いた時点でその法案の詳細取得を始める
+        bill_ids = []
+        submitters_info_by_bill = []
+        with ThreadPoolExecutor(max_workers=RIPPOU_MAX_WORKERS) as search_executor,\
+                ThreadPoolExecutor(max_workers=RIPPOU_MAX_WORKERS) as details_executor:
+            first_page_info_json = self.download_search_page(0)
+            first_page_futures = self.__enqueue_bill_details(first_page_info_json, details_executor)
+            page_futures = [search_executor.submit(self.__download_search_page_and_enqueue, page_num, details_executor)
+                            for page_num in range(1, first_page_info_json['total_pages'])]
+            for bill_futures in [first_page_futures] + [page_future.result() for page_future in page_futures]:
+                for bill_id, bill_future in bill_futures:
+                    bill_ids.append(bill_id)
+                    submitters_info_by_bill.append(bill_future.result() if bill_future else None)
+        return (bill_ids, submitters_info_by_bill)
+
+    def __download_search_page_and_enqueue(self, page_num: int, details_executor: ThreadPoolExecutor) -> list[tuple]:
+        page_info_json = self.download_search_page(page_num)
+        return self.__enqueue_bill_details(page_info_json, details_executor)
+
+    def __enqueue_bill_details(self, page_info_json: dict, details_executor: ThreadPoolExecutor) -> list[tuple]:
+        bill_ids = self.get_bill_ids(page_info_json['data'])
+        if (RIPPOU_USE_BROWSER):
+            return [(bill_id, None) for bill_id in bill_ids]
+        return [(bill_id, details_executor.submit(self.download_bill_submitters_info, bill_id))
+                for bill_id in bill_ids]
+
+    def complete_submitters_info_by_browser(self, bill_ids, submitters_info_by_bill):
+        browser_bill_ids = [bill_id for bill_id, submitters_info in zip(bill_ids, submitters_info_by_bill)
+                            if submitters_info is None]
+        self.browser_bill_count = len(browser_bill_ids)
+        if (browser_bill_ids):
+            if (not RIPPOU_USE_BROWSER):
+                print(f'{len(browser_bill_ids)}件の法案を詳細APIから取得できなかったため、ブラウザで取得します。')
+            browser_submitters_info, self.failed_bill_ids = self.download_submitters_info_by_browser(browser_bill_ids)
+            submitters_info_by_bill = [browser_submitters_info.get(bill_id) if submitters_info is None else submitters_info
+                                       for bill_id, submitters_info in zip(bill_ids, submitters_info_by_bill)]
+
         submitters_info_list = []
-        driver = Chrome(options=self.options)
-        for bill_id in bill_ids:
-            print(f'https://hourei.ndl.go.jp/#/detail?billId={bill_id} の情報を取得中')
-            driver.get(f'https://hourei.ndl.go.jp/#/detail?billId={bill_id}')
-            sleep(2)
-            bill_page_response = driver.page_source.encode('utf-8')
-            bill_page_bs4 = BeautifulSoup(bill_page_response, 'html.parser')
-            submitters_info_by_law_list = self.parse_bill_page(bill_id, bill_page_bs4)
-            if submitters_info_by_law_list:
-                submitters_info_list.extend(submitters_info_by_law_list)
-        driver.quit()
+        for submitters_info in submitters_info_by_bill:
+            if (submitters_info is None):
+                continue
+            submitters_info_list.extend(submitters_info)
         return submitters_info_list
 
+    def download_bill_detail(self, bill_id) -> dict | None:
+        print(f'{BILL_DETAIL_URL_BASE}{bill_id} の情報を取得中')
+        bill_detail_response = get_page(BILL_DETAIL_URL_BASE + str(bill_id))
+        if (bill_detail_response.status_code != 200):
+            return None
+        try:
+            return json.loads(bill_detail_response.content)
+        except ValueError:
+            return None
+
+    def download_bill_submitters_info(self, bill_id) -> list[dict] | None:
+        # None の法案はブラウザで開き直す
+        bill_detail = self.download_bill_detail(bill_id)
+        if (bill_detail is None):
+            return None
+        return self.parse_bill_detail(bill_id, bill_detail)
+
+    def download_submitters_info_by_browser(self, bill_ids) -> tuple[dict, list]:
+        # JavaScriptで描画されるページを読むときだけseleniumを使う
+        # 何度開いても取得できなかった法案は空の結果にせず、取得できなかった法案として返す
+        bill_pages = BillPageBrowserPool().download_pages(bill_ids)
+        submitters_info_by_bill = {}
+        failed_bill_ids = []
+        for bill_id in bill_ids:
+            if (bill_id not in bill_pages):
+                failed_bill_ids.append(bill_id)
+                continue
+            bill_page_bs4 = parse_html(bill_pages[bill_id])
+            submitters_info_by_bill[bill_id] = self.parse_bill_page(bill_id, bill_page_bs4) or []
+        return (submitters_info_by_bill, failed_bill_ids)
+
+    def has_bill_detail_keys(self, bill_detail) -> bool:
+        # 提出者(その他) は空でもよいが、他の項目は中身が入っていなければならない
+        if (not isinstance(bill_detail, dict) or any(key not in bill_detail for key in BILL_REQUIRED_KEYS)):
+            return False
+        return all(str(bill_detail[key] or '').strip() for key in [BILL_TITLE_KEY, BILL_NUMBER_KEY, BILL_SUBMITTER_KEY])
+
+    def parse_bill_detail(self, bill_id, bill_detail: dict) -> list[dict] | None:
+        # 項目が揃っていない応答は空の行として書かず、None を返してブラウザで開き直す
+        if (not self.has_bill_detail_keys(bill_detail)):
+            print(f'{BILL_DETAIL_URL_BASE}{bill_id} に必要な項目が無いため、ブラウザで取得します。')
+            return None
+        law_number = str(bill_detail[BILL_NUMBER_KEY])
+        law_submitter = str(bill_detail[BILL_SUBMITTER_KEY]).strip()
+        if (law_number == f'第{MEETING_TERM}回国会'):
+            print(f'{law_submitter}から提出されたものであるためスキップしました。')
+            return []
+
+        law_title = str(bill_detail[BILL_TITLE_KEY])
+        law_represent_submitter = law_submitter.split('、')[0]
+        law_other_submitters = bill_detail.get(BILL_OTHER_SUBMITTERS_KEY) or []
+        if (isinstance(law_other_submitters, str)):
+            law_other_submitters = law_other_submitters.split(',')
+        return self.get_law_info_list(bill_id, law_number, law_title, law_represent_submitter, law_other_submitters) or []
+
     def parse_bill_page(self, bill_id, bill_page_bs4):
         li_list = bill_page_bs4.find_all('li')
         #checker =[f'{i} : {content}' for (i, content) in enumerate(li_list)]
         #pprint(checker)
         
         if (not self.is_submitted_by_member(li_list)):
-            law_submitter_row_elm = li_list[14]
+            law_submitter_row_elm = li_list[LAST_LI_INDEX]
             law_submitter_elm = law_submitter_row_elm.find_all('div')[-1]
             law_submitter = law_submitter_elm.text.strip()
             print(f'{law_submitter}から提出されたものであるためスキップしました。')
@@ -76,25 +256,28 @@ class GiinRippouClient:
             law_other_submitters = law_other_submitters_elm.text.split(',')
             #print(law_other_submitters)
 
-            law_submitters = []
-            law_submitters.append(law_represent_submitter)
-            law_submitters.extend(law_other_submitters)
-            #print(law_submitters)
-
-            if (self.is_submitted_by_leader(law_represent_submitter)):
-                print(f'{law_represent_submitter}から提出されたものであるためスキップしました。')
-                return
-
-            law_info_list = []
-            for law_submitter in law_submitters:
-                law_dict = {
-                    'bill_id': bill_id,
-                    '提出番号': law_number,
-                    '法律案名': law_title,
-                    '提出者': law_submitter
-                }
-                law_info_list.append(law_dict)
-            return law_info_list
+            return self.get_law_info_list(bill_id, law_number, law_title, law_represent_submitter, law_other_submitters)
+
+    def get_law_info_list(self, bill_id, law_number, law_title, law_represent_submitter, law_other_submitters):
+        law_submitters = []
+        law_submitters.append(law_represent_submitter)
+        law_submitters.extend(law_other_submitters)
+        #print(law_submitters)
+
+        if (self.is_submitted_by_leader(law_represent_submitter)):
+            print(f'{law_represent_submitter}から提出されたものであるためスキップしました。')
+            return
+
+        law_info_list = []
+        for law_submitter in law_submitters:
+            law_dict = {
+                'bill_id': bill_id,
+                '提出番号': law_number,
+                '法律案名': law_title,
+                '提出者': law_submitter
+            }
+            law_info_list.append(law_dict)
+        return law_info_list
 
     def is_submitted_by_member(self, li_list):
         law_number_row_elm = li_list[11]
@@ -108,24 +291,41 @@ class GiinRippouClient:
     def get_bill_ids(self, page_data_list):
         return [page_data['bill_id'] for page_data in page_data_list]
 
-    def get_total_search_pages(self) -> int:
-        page_info_json_str = requests.get(self.url_base)
-        page_info_json = json.loads(page_info_json_str.content)
-        total_pages = page_info_json['total_pages']
-        return total_pages
-
     def __get_page_param(self, page_num: int) -> str:
         return f'&page={page_num}'
 
     def download_search_page(self, page_num: int) -> dict:
-        page_info_json_str = requests.get(self.url_base + self.__get_page_param(page_num))
+        page_info_json_str = get_page(self.url_base + self.__get_page_param(page_num))
         return json.loads(page_info_json_str.content)
 
-    def download_search_pages(self) -> list:
-        total_pages = self.get_total_search_pages()
-        page_data_list = []
-        for i in range(0, total_pages):
-            page_info_json = self.download_search_page(i)
-            current_page_data = page_info_json['data']
-            page_data_list.extend(current_page_data)
-        return page_data_list
\ No newline at end of file
+
+def load_bill_detail_sample(sample_path=RIPPOU_BILL_DETAIL_SAMPLE) -> dict:
+    with open(sample_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_bill_detail_sample(bill_id, sample_path=RIPPOU_BILL_DETAIL_SAMPLE):
+    # 実際の応答を見本として保存する
+    bill_detail_response = get_page(BILL_DETAIL_URL_BASE + str(bill_id))
+    bill_detail = json.loads(bill_detail_response.content)
+    with open(sample_path, 'w', encoding='utf-8') as f:
+        json.dump(bill_detail, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def check_bill_detail_sample(sample_path=RIPPOU_BILL_DETAIL_SAMPLE) -> list[dict]:
+    # 見本に項目が揃っていなければ、項目名が応答と合っていない
+    bill_detail = load_bill_detail_sample(sample_path)
+    client = GiinRippouClient(True)
+    if (not client.has_bill_detail_keys(bill_detail)):
+        missing_keys = [key for key in BILL_REQUIRED_KEYS if key not in bill_detail]
+        raise ValueError(f'{sample_path} に項目 {missing_keys} がありません。')
+    return client.parse_bill_detail(bill_detail.get('bill_id'), bill_detail)
+
+
+if __name__ == '__main__':
+    # 使い方: python giin_rippou.py [法案ID]
+    if (len(sys.argv) > 1):
+        save_bill_detail_sample(sys.argv[1])
+    for law_info in check_bill_detail_sample():
+        print(law_info)
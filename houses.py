@@ -0,0 +1,13 @@
+import re
+
+# 院の識別子と、参議院の会議URLからsidを取り出す処理
+# database・search_index・excel_generator で共有し、SQLAlchemyを読み込まずに使えるようにする
+
+SHUGIIN = 'shugiin'
+SANGIIN = 'sangiin'
+SANGIIN_SID_PATTERN = re.compile(r"sid=(\d+)")
+
+
+def get_sangiin_sid(meeting_url) -> int:
+    sid_match = SANGIIN_SID_PATTERN.search(str(meeting_url))
+    return int(sid_match.group(1)) if sid_match else 0
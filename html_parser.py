@@ -0,0 +1,31 @@
+from functools import lru_cache
+from importlib.util import find_spec
+from bs4 import BeautifulSoup, SoupStrainer
+
+from config import HTML_PARSER
+
+# すべてのページクラスはここを通してBeautifulSoupを作る
+# バックエンド名と、それに必要なパッケージ
+PARSER_BACKENDS = {
+    'html.parser': None,
+    'lxml': 'lxml',
+    'html5lib': 'html5lib'
+}
+
+
+def is_parser_available(parser: str) -> bool:
+    required_package = PARSER_BACKENDS[parser]
+    return required_package is None or find_spec(required_package) is not None
+
+
+@lru_cache(maxsize=None)
+def get_parser_backend(parser: str = HTML_PARSER) -> str:
+    if (is_parser_available(parser)):
+        return parser
+    print(f'{parser} がインストールされていないため html.parser を使います。')
+    return 'html.parser'
+
+
+def parse_html(content: bytes | str, parser: str = HTML_PARSER, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+    # parse_onlyを渡すと、一致した要素の部分木だけを組み立てる
+    return BeautifulSoup(content, get_parser_backend(parser), parse_only=parse_only)
@@ -0,0 +1,221 @@
+import hashlib
+import os
+import sqlite3
+from datetime import date
+from threading import Lock, get_ident
+from time import time
+from urllib.parse import urlparse
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from config import\
+    HTTP_CACHE_DIR,\
+    HTTP_CACHE_MAX_BYTES,\
+    HTTP_CACHE_DEFAULT_TTL,\
+    HTTP_CACHE_TTL,\
+    HTTP_CACHE_ACCESS_FLUSH_SIZE
+
+# URLをキーにしたディスクキャッシュ
+# 本文は内容のハッシュで objects/ 以下に保存し、索引はSQLiteで持つ
+# 対象の日 (page_date) が分かるページは、その日が終わる前に取得したものを期限に関係なく再検証する
+# キャッシュを使った時刻 (accessed_at) はメモリに溜めておき、追い出しの前と close でまとめて書き込む
+
+
+class CacheEntry:
+    def __init__(self, url, content_hash, etag, last_modified, content_type, fetched_at, size, page_date):
+        self.url = url
+        self.content_hash = content_hash
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_type = content_type
+        self.fetched_at = fetched_at
+        self.size = size
+        self.page_date = page_date
+
+    def is_settled(self) -> bool:
+        # 対象の日が終わってから取得したページか。当日以降に取得したページはまだ更新されうる
+        if (self.page_date is None):
+            return True
+        return date.fromtimestamp(self.fetched_at).isoformat() > self.page_date
+
+    def is_fresh(self, ttl: int | None) -> bool:
+        # ttlがNoneのページは変更されないものとして扱う
+        if (ttl is None):
+            return True
+        return time() - self.fetched_at < ttl
+
+    def get_conditional_headers(self) -> dict:
+        headers = {}
+        if (self.etag):
+            headers['If-None-Match'] = self.etag
+        if (self.last_modified):
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_response(self, content: bytes) -> Response:
+        response = Response()
+        response.status_code = 200
+        response.url = self.url
+        response._content = content
+        response.headers = CaseInsensitiveDict()
+        if (self.content_type):
+            response.headers['Content-Type'] = self.content_type
+        if (self.etag):
+            response.headers['ETag'] = self.etag
+        if (self.last_modified):
+            response.headers['Last-Modified'] = self.last_modified
+        return response
+
+
+class HttpCache:
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, max_bytes=HTTP_CACHE_MAX_BYTES,
+                 access_flush_size=HTTP_CACHE_ACCESS_FLUSH_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.access_flush_size = access_flush_size
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.__lock = Lock()
+        self.__connection = sqlite3.connect(
+            os.path.join(cache_dir, 'index.sqlite3'), check_same_thread=False)
+        # 索引は本文から作り直せるので、コミット毎の同期は WAL のチェックポイントに任せる
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute('PRAGMA synchronous=NORMAL')
+        self.__accessed_at: dict[str, float] = {}
+        self.__connection.execute(
+            '''CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_type TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                page_date TEXT
+            )''')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)')
+        self.__add_page_dates()
+        self.__connection.commit()
+        self.__total_size = self.__connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def __add_page_dates(self):
+        # page_date の列が無いキャッシュは列を足す。既存のページは日が分からないものとして扱う
+        columns = [row[1] for row in self.__connection.execute('PRAGMA table_info(entries)')]
+        if ('page_date' not in columns):
+            self.__connection.execute('ALTER TABLE entries ADD COLUMN page_date TEXT')
+
+    def get_ttl(self, url: str) -> int | None:
+        return HTTP_CACHE_TTL.get(urlparse(url).netloc, HTTP_CACHE_DEFAULT_TTL)
+
+    def __get_object_path(self, content_hash: str) -> str:
+        return os.path.join(self.objects_dir, content_hash[:2], content_hash)
+
+    def lookup(self, url: str) -> CacheEntry | None:
+        with self.__lock:
+            row = self.__connection.execute(
+                'SELECT url, content_hash, etag, last_modified, content_type, fetched_at, size, page_date '
+                'FROM entries WHERE url = ?',
+                (url,)).fetchone()
+        if (row):
+            return CacheEntry(*row)
+
+    def get_urls(self) -> list[str]:
+        with self.__lock:
+            rows = self.__connection.execute('SELECT url FROM entries ORDER BY url').fetchall()
+        return [row[0] for row in rows]
+
+    def read(self, entry: CacheEntry) -> bytes | None:
+        try:
+            with open(self.__get_object_path(entry.content_hash), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        with self.__lock:
+            self.__accessed_at[entry.url] = time()
+            if (len(self.__accessed_at) >= self.access_flush_size):
+                self.__flush_accessed_at()
+                self.__connection.commit()
+        return content
+
+    def store(self, url: str, response: Response, page_date: date | None = None):
+        content = response.content
+        content_hash = hashlib.sha256(content).hexdigest()
+        object_path = self.__get_object_path(content_hash)
+        if (not os.path.exists(object_path)):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f'{object_path}.{os.getpid()}.{get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, object_path)
+
+        now = time()
+        with self.__lock:
+            replaced = self.__connection.execute(
+                'SELECT size, page_date FROM entries WHERE url = ?', (url,)).fetchone()
+            if (replaced):
+                self.__total_size -= replaced[0]
+            # 取り直したページは、対象の日を渡されなければ前に記録した日を引き継ぐ
+            page_date_text = self.__to_text(page_date) or (replaced[1] if replaced else None)
+            self.__total_size += len(content)
+            self.__connection.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, content_hash, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                 response.headers.get('Content-Type'), now, now, len(content), page_date_text))
+            self.__connection.commit()
+            self.__evict()
+
+    def revalidate(self, url: str, page_date: date | None = None):
+        # 304が返った場合は取得時刻と対象の日だけを更新する
+        now = time()
+        with self.__lock:
+            self.__connection.execute(
+                'UPDATE entries SET fetched_at = ?, accessed_at = ?, page_date = COALESCE(?, page_date) WHERE url = ?',
+                (now, now, self.__to_text(page_date), url))
+            self.__connection.commit()
+
+    def set_page_date(self, url: str, page_date: date):
+        # 取得した後で中身から対象の日が分かったページに、その日を記録する
+        with self.__lock:
+            self.__connection.execute(
+                'UPDATE entries SET page_date = ? WHERE url = ?', (self.__to_text(page_date), url))
+            self.__connection.commit()
+
+    def __to_text(self, page_date: date | None) -> str | None:
+        return None if page_date is None else page_date.isoformat()
+
+    def __flush_accessed_at(self):
+        # store・revalidate で新しい時刻が入っていれば、そちらを残す
+        self.__connection.executemany(
+            'UPDATE entries SET accessed_at = MAX(accessed_at, ?) WHERE url = ?',
+            [(accessed_at, url) for url, accessed_at in self.__accessed_at.items()])
+        self.__accessed_at.clear()
+
+    def close(self):
+        with self.__lock:
+            self.__flush_accessed_at()
+            self.__connection.commit()
+            self.__connection.close()
+
+    def __evict(self):
+        if (self.__total_size <= self.max_bytes):
+            return
+        # 最後に参照された時刻が古いものから消す
+        self.__flush_accessed_at()
+        rows = self.__connection.execute(
+            'SELECT url, content_hash, size FROM entries ORDER BY accessed_at').fetchall()
+        for url, content_hash, size in rows:
+            if (self.__total_size <= self.max_bytes):
+                break
+            self.__connection.execute('DELETE FROM entries WHERE url = ?', (url,))
+            self.__total_size -= size
+            is_referenced = self.__connection.execute(
+                'SELECT 1 FROM entries WHERE content_hash = ? LIMIT 1', (content_hash,)).fetchone()
+            if (not is_referenced):
+                try:
+                    os.remove(self.__get_object_path(content_hash))
+                except FileNotFoundError:
+                    pass
+        self.__connection.commit()
@@ -0,0 +1,249 @@
+import random
+from datetime import date
+from threading import BoundedSemaphore, Lock
+from time import sleep
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import\
+    HTTP_TIMEOUT,\
+    HTTP_MAX_RETRIES,\
+    HTTP_BACKOFF_BASE,\
+    HTTP_BACKOFF_MAX,\
+    HTTP_POOL_MAXSIZE,\
+    HTTP_HOST_CONCURRENCY,\
+    HTTP_DEFAULT_HOST_CONCURRENCY,\
+    HTTP_CACHE_ENABLED,\
+    HTTP_CACHE_MODE,\
+    PAGE_ARCHIVE_ENABLED,\
+    PAGE_ARCHIVE_OFFLINE
+from http_cache import HttpCache
+from page_archive import PageArchive
+
+# 全スクレイパーが共有する取得層
+# ホスト毎にkeep-aliveの接続プールを持ち、5xxと接続エラーはジッター付き指数バックオフで再試行する
+
+
+class PageFetchError(Exception):
+    # 再試行しても200が返らなかったページ。取得できなかったページを空のページとして扱わないために使う
+    def __init__(self, url: str, status_code: int):
+        super().__init__(url, status_code)
+        self.url = url
+        self.status_code = status_code
+
+    def __str__(self):
+        return f"{self.url} の取得に失敗しました (ステータス{self.status_code})。"
+
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.revalidated = 0
+        self.archive_hits = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "cache_hits": self.cache_hits,
+            "revalidated": self.revalidated,
+            "archive_hits": self.archive_hits
+        }
+
+
+class HttpClient:
+    def __init__(
+            self,
+            timeout=HTTP_TIMEOUT,
+            max_retries=HTTP_MAX_RETRIES,
+            backoff_base=HTTP_BACKOFF_BASE,
+            backoff_max=HTTP_BACKOFF_MAX,
+            pool_maxsize=HTTP_POOL_MAXSIZE,
+            host_concurrency=HTTP_HOST_CONCURRENCY,
+            cache: HttpCache | None = None,
+            cache_mode=HTTP_CACHE_MODE,
+            archive: PageArchive | None = None,
+            offline=PAGE_ARCHIVE_OFFLINE):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.host_concurrency = host_concurrency
+        self.cache = cache
+        self.cache_mode = cache_mode
+        self.archive = archive
+        self.offline = offline
+        self.session = self.__create_session(pool_maxsize)
+        self.stats: dict[str, HostStats] = {}
+        self.__host_semaphores: dict[str, BoundedSemaphore] = {}
+        self.__lock = Lock()
+
+    def __create_session(self, pool_maxsize: int) -> requests.Session:
+        session = requests.Session()
+        # 接続プールはurllib3側でホスト毎に作られる
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def __get_host_semaphore(self, host: str) -> BoundedSemaphore:
+        with self.__lock:
+            if (host not in self.__host_semaphores):
+                concurrency = self.host_concurrency.get(host, HTTP_DEFAULT_HOST_CONCURRENCY)
+                self.__host_semaphores[host] = BoundedSemaphore(concurrency)
+                self.stats[host] = HostStats()
+            return self.__host_semaphores[host]
+
+    def __get_backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def __record_response(self, host: str, response: requests.Response):
+        with self.__lock:
+            self.stats[host].requests += 1
+            self.stats[host].bytes += len(response.content)
+
+    def __record_retry(self, host: str):
+        with self.__lock:
+            self.stats[host].retries += 1
+
+    def __record_cache_hit(self, host: str, revalidated=False):
+        with self.__lock:
+            self.stats[host].cache_hits += 1
+            if (revalidated):
+                self.stats[host].revalidated += 1
+
+    def __record_archive_hit(self, host: str):
+        with self.__lock:
+            self.stats[host].archive_hits += 1
+
+    def get(self, url: str, headers: dict | None = None, page_date: date | None = None) -> requests.Response:
+        # page_date はページが対象とする日。その日が終わる前に取得したページはキャッシュから返さず再検証する
+        if (self.offline):
+            return self.__get_archived(url)
+        response = self.__get_cached(url, headers, page_date)
+        if (self.archive and response.status_code == 200):
+            self.archive.store(url, response)
+        return response
+
+    def __get_archived(self, url: str) -> requests.Response:
+        # アーカイブに無いページは404として扱う
+        host = urlparse(url).netloc
+        self.__get_host_semaphore(host)
+        response = self.archive.get_response(url) if self.archive else None
+        if (response is None):
+            response = requests.Response()
+            response.status_code = 404
+            response.url = url
+            response._content = b''
+            return response
+        self.__record_archive_hit(host)
+        return response
+
+    def set_page_date(self, url: str, page_date: date):
+        # 取得した後で中身から対象の日が分かったページに、その日を記録する
+        if (self.cache):
+            self.cache.set_page_date(url, page_date)
+
+    def __get_cached(self, url: str, headers: dict | None, page_date: date | None) -> requests.Response:
+        if (self.cache is None):
+            return self.__fetch(url, headers)
+
+        host = urlparse(url).netloc
+        self.__get_host_semaphore(host)
+        entry = self.cache.lookup(url)
+        if (entry and entry.is_settled() and (self.cache_mode == 'cache_first' or entry.is_fresh(self.cache.get_ttl(url)))):
+            content = self.cache.read(entry)
+            if (content is not None):
+                self.__record_cache_hit(host)
+                return entry.to_response(content)
+
+        request_headers = dict(headers or {})
+        if (entry):
+            request_headers.update(entry.get_conditional_headers())
+        response = self.__fetch(url, request_headers)
+        if (entry and response.status_code == 304):
+            content = self.cache.read(entry)
+            if (content is not None):
+                self.cache.revalidate(url, page_date)
+                self.__record_cache_hit(host, revalidated=True)
+                return entry.to_response(content)
+            # 本文が消えていた場合は取り直す
+            response = self.__fetch(url, headers)
+        if (response.status_code == 200):
+            self.cache.store(url, response, page_date)
+        return response
+
+    def __fetch(self, url: str, headers: dict | None) -> requests.Response:
+        host = urlparse(url).netloc
+        host_semaphore = self.__get_host_semaphore(host)
+        for attempt in range(self.max_retries + 1):
+            try:
+                with host_semaphore:
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if (attempt == self.max_retries):
+                    raise
+                print(f"{url} の取得に失敗しました ({e.__class__.__name__})。再試行します。")
+            else:
+                self.__record_response(host, response)
+                if (response.status_code < 500 or attempt == self.max_retries):
+                    return response
+                print(f"{url} がステータス{response.status_code}を返しました。再試行します。")
+            self.__record_retry(host)
+            sleep(self.__get_backoff(attempt))
+
+    def close(self):
+        if (self.cache):
+            self.cache.close()
+        if (self.archive):
+            self.archive.close()
+        self.session.close()
+
+    def print_stats(self):
+        for host, host_stats in self.stats.items():
+            print(
+                f"{host}: {host_stats.requests}件 {host_stats.bytes / 1024 / 1024:.1f}MB "
+                f"(再試行{host_stats.retries}回, キャッシュ{host_stats.cache_hits}件, 再検証{host_stats.revalidated}件, "
+                f"アーカイブ{host_stats.archive_hits}件)")
+
+
+shared_client: HttpClient | None = None
+shared_client_lock = Lock()
+
+
+def get_shared_client() -> HttpClient:
+    # キャッシュとアーカイブは最初に取得する時に開く
+    # import しただけでは何も作らないので、解析だけを行うプロセスはキャッシュ・アーカイブを持たない
+    global shared_client
+    with shared_client_lock:
+        if (shared_client is None):
+            shared_client = HttpClient(
+                cache=HttpCache() if HTTP_CACHE_ENABLED else None,
+                archive=PageArchive() if PAGE_ARCHIVE_ENABLED or PAGE_ARCHIVE_OFFLINE else None)
+        return shared_client
+
+
+def close_shared_client():
+    # キャッシュに溜めた参照時刻を書き込み、アーカイブを閉じる。次に取得する時は開き直す
+    global shared_client
+    with shared_client_lock:
+        if (shared_client is not None):
+            shared_client.close()
+            shared_client = None
+
+
+def get_page(url: str, headers: dict | None = None, page_date: date | None = None) -> requests.Response:
+    return get_shared_client().get(url, headers, page_date)
+
+
+def get_page_content(url: str, headers: dict | None = None, page_date: date | None = None) -> bytes:
+    # 200以外は PageFetchError にする
+    response = get_shared_client().get(url, headers, page_date)
+    if (response.status_code != 200):
+        raise PageFetchError(url, response.status_code)
+    return response.content
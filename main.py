@@ -1,23 +1,35 @@
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
+from multiprocessing import get_context
 from shugiin_hatsugen import MeetingsDownloader as ShugiinMeetingsDownloader
+from shugiin_hatsugen import\
+    MEETING_ROW_COLUMNS as SHUGIIN_MEETING_ROW_COLUMNS,\
+    GOVERNMENT_ROW_COLUMNS as SHUGIIN_GOVERNMENT_ROW_COLUMNS
 from shugiin_hatsugen import DietMemberDownloader as ShugiinMemberDownloader
 from sangiin_hatsugen import MeetingsDownloader as SangiinMeetingsDownloader
+from sangiin_hatsugen import MEETING_ROW_COLUMNS as SANGIIN_MEETING_ROW_COLUMNS
 from sangiin_hatsugen import UpperHouseMembersDownloader as SangiinMemberDownloader
 from giin_rippou import GiinRippouClient
 from shuisho import ShugiinShuishoClient, SangiinShuishoClient
-from excel_generator import ShugiinExcelGenerator, SangiinExcelGenerator
+from excel_generator import generate_excel
+from http_client import get_shared_client, close_shared_client
+from checkpoint import CrawlCheckpoint
+from database import Database
+from search_index import SearchIndex
+from dataset_store import write_dataset, open_dataset_sink
+from speaker_parser import parse_shugiin_speakers, parse_sangiin_speakers, parse_government_speakers
 
 from config import\
-    SHUGIIN_MEETING_CSV,\
-    SHUGIIN_MEMBERS_CSV,\
-    SHUGIIN_RIPPOU_CSV,\
-    SHUGIIN_SHUISHO_CSV,\
     SHUGIIN_OUTPUT_FILE_NAME,\
-    SANGIIN_MEETING_CSV,\
-    SANGIIN_MEMBERS_CSV,\
-    SANGIIN_RIPPOU_CSV,\
-    SANGIIN_SHUISHO_CSV,\
     SANGIIN_OUTPUT_FILE_NAME,\
+    SHUGIIN_MEETING_CHECKPOINT,\
+    SHUGIIN_MEETING_CHECKPOINT_ROWS,\
+    SHUGIIN_GOVERNMENT_SPEAKERS_CHECKPOINT,\
+    SHUGIIN_GOVERNMENT_SPEAKERS_CHECKPOINT_ROWS,\
+    SANGIIN_MEETING_CHECKPOINT,\
+    SANGIIN_MEETING_CHECKPOINT_ROWS,\
+    EXCEL_PARALLEL,\
+    PROCESS_START_METHOD,\
     DATE_START,\
     DATE_END
 
@@ -32,14 +44,48 @@ DOWNLOAD_SANGIIN_MEMBERS = False
 DOWNLOAD_SANGIIN_RIPPOU = False
 DOWNLOAD_SANGIIN_SHUISHO = True
 
-# 衆議院
-if (DOWNLOAD):
+# 前回の続きから発言を収集し、既存の行に追加する
+RESUME_MEETINGS = True
+
+# 収集と同時に全文検索索引 (config.SEARCH_INDEX_PATH) に追加する
+SAVE_SEARCH_INDEX = True
+
+# 出力した中間データをデータベース (config.DATABASE_URL) に保存する
+SAVE_DATABASE = False
+
+
+def get_index_writers(search_index: SearchIndex | None, dataset_name: str) -> list:
+    return search_index.get_writers(dataset_name) if search_index else []
+
+
+def print_failed_bills(rippou_client: GiinRippouClient):
+    # 取得できなかった法案は結果に含まれないので、再実行できるよう法案IDを表示する
+    if (rippou_client.failed_bill_ids):
+        print(f'{len(rippou_client.failed_bill_ids)}件の法案を取得できませんでした: '
+              f'{", ".join(str(bill_id) for bill_id in rippou_client.failed_bill_ids)}')
+
+
+def download(search_index: SearchIndex | None):
+    # 衆議院
     ## 発言
     if (DOWNLOAD_SHUGIIN_MEETING):
         print('衆議院議員の発言を収集中...')
-        shugiin_meetings_downloader = ShugiinMeetingsDownloader(DATE_START, DATE_END)
-        shugiin_meetings_df = shugiin_meetings_downloader.meetings_df
-        shugiin_meetings_df.to_csv(SHUGIIN_MEETING_CSV)
+        shugiin_meetings_checkpoint = CrawlCheckpoint(
+            SHUGIIN_MEETING_CHECKPOINT, SHUGIIN_MEETING_CHECKPOINT_ROWS) if RESUME_MEETINGS else None
+        shugiin_government_speakers_checkpoint = CrawlCheckpoint(
+            SHUGIIN_GOVERNMENT_SPEAKERS_CHECKPOINT, SHUGIIN_GOVERNMENT_SPEAKERS_CHECKPOINT_ROWS) if RESUME_MEETINGS else None
+        shugiin_meetings_downloader = ShugiinMeetingsDownloader(
+            DATE_START, DATE_END, checkpoint=shugiin_meetings_checkpoint,
+            government_checkpoint=shugiin_government_speakers_checkpoint, stream=True)
+        # 1日分ずつ受け取り、一定の行数毎に解析して中間データに追記する
+        # 索引は会議毎に発言の順番を数えるので、同じ日の行は同じチャンクに入れる
+        with open_dataset_sink('shugiin_meetings', SHUGIIN_MEETING_ROW_COLUMNS, parse_shugiin_speakers,
+                               group_column='date',
+                               extra_writers=get_index_writers(search_index, 'shugiin_meetings')) as shugiin_meeting_sink,\
+                open_dataset_sink('shugiin_government_speakers', SHUGIIN_GOVERNMENT_ROW_COLUMNS, parse_government_speakers,
+                                  group_column='date',
+                                  extra_writers=get_index_writers(search_index, 'shugiin_government_speakers')) as shugiin_government_speakers_sink:
+            shugiin_meetings_downloader.write_rows(shugiin_meeting_sink, shugiin_government_speakers_sink)
         print('完了')
 
     ## 議員
@@ -47,7 +93,7 @@ if (DOWNLOAD):
         print('衆議院議員の一覧を収集中...')
         shugiin_member_downloader = ShugiinMemberDownloader()
         shugiin_members_df = shugiin_member_downloader.diet_members_df
-        shugiin_members_df.to_csv(SHUGIIN_MEMBERS_CSV)
+        write_dataset('shugiin_members', shugiin_members_df, get_index_writers(search_index, 'shugiin_members'))
         print('完了')
 
     # 議員立法
@@ -55,7 +101,8 @@ if (DOWNLOAD):
         print('衆議院議員の議員立法を収集中...')
         shugiin_rippou_client = GiinRippouClient(True)
         shugiin_rippou_df = shugiin_rippou_client.generate_page_df()
-        shugiin_rippou_df.to_csv(SHUGIIN_RIPPOU_CSV)
+        write_dataset('shugiin_rippou', shugiin_rippou_df, get_index_writers(search_index, 'shugiin_rippou'))
+        print_failed_bills(shugiin_rippou_client)
         print('完了')
 
     # 主意書
@@ -63,16 +110,21 @@ if (DOWNLOAD):
         print('衆議院議員の主意書を収集中...')
         shugiin_shuisho_client = ShugiinShuishoClient()
         shugiin_shuisho_df = shugiin_shuisho_client.generate_questions_df()
-        shugiin_shuisho_df.to_csv(SHUGIIN_SHUISHO_CSV)
+        write_dataset('shugiin_shuisho', shugiin_shuisho_df, get_index_writers(search_index, 'shugiin_shuisho'))
         print('完了')
 
     # 参議院
     ## 発言
     if (DOWNLOAD_SANGIIN_MEETING):
         print('参議院議員の発言を収集中...')
-        sangiin_meetings_downloader = SangiinMeetingsDownloader()
-        sangiin_meetings_df = sangiin_meetings_downloader.meetings_df
-        sangiin_meetings_df.to_csv(SANGIIN_MEETING_CSV)
+        sangiin_meetings_checkpoint = CrawlCheckpoint(
+            SANGIIN_MEETING_CHECKPOINT, SANGIIN_MEETING_CHECKPOINT_ROWS) if RESUME_MEETINGS else None
+        sangiin_meetings_downloader = SangiinMeetingsDownloader(checkpoint=sangiin_meetings_checkpoint, stream=True)
+        # 発言時間は会議毎に計算するので、同じ会議の行は同じチャンクで解析する
+        with open_dataset_sink('sangiin_meetings', SANGIIN_MEETING_ROW_COLUMNS, parse_sangiin_speakers,
+                               group_column='meeting_url',
+                               extra_writers=get_index_writers(search_index, 'sangiin_meetings')) as sangiin_meeting_sink:
+            sangiin_meetings_downloader.write_rows(sangiin_meeting_sink)
         print('完了')
 
     ## 議員
@@ -80,7 +132,7 @@ if (DOWNLOAD):
         print('参議院議員の一覧を収集中...')
         sangiin_member_downloader = SangiinMemberDownloader()
         sangiin_member_df = sangiin_member_downloader.upper_house_members_df
-        sangiin_member_df.to_csv(SANGIIN_MEMBERS_CSV)
+        write_dataset('sangiin_members', sangiin_member_df, get_index_writers(search_index, 'sangiin_members'))
         print('完了')
 
     # 議員立法
@@ -88,7 +140,8 @@ if (DOWNLOAD):
         print('参議院議員の議員立法を収集中...')
         sangiin_rippou_client = GiinRippouClient(False)
         sangiin_rippou_df = sangiin_rippou_client.generate_page_df()
-        sangiin_rippou_df.to_csv(SANGIIN_RIPPOU_CSV)
+        write_dataset('sangiin_rippou', sangiin_rippou_df, get_index_writers(search_index, 'sangiin_rippou'))
+        print_failed_bills(sangiin_rippou_client)
         print('完了')
 
     # 主意書
@@ -96,16 +149,48 @@ if (DOWNLOAD):
         print('参議院議員の主意書を収集中...')
         sangiin_shuisho_client = SangiinShuishoClient()
         sangiin_shuisho_df = sangiin_shuisho_client.generate_questions_df()
-        sangiin_shuisho_df.to_csv(SANGIIN_SHUISHO_CSV)
+        write_dataset('sangiin_shuisho', sangiin_shuisho_df, get_index_writers(search_index, 'sangiin_shuisho'))
+        print('完了')
+
+    get_shared_client().print_stats()
+
+
+def main():
+    if (DOWNLOAD):
+        search_index = SearchIndex() if SAVE_SEARCH_INDEX else None
+        try:
+            download(search_index)
+        finally:
+            # 納品ファイルの生成では別のプロセスが索引を開くので、ここで閉じておく
+            if (search_index):
+                search_index.close()
+            close_shared_client()
+
+    # データベース
+    if (SAVE_DATABASE):
+        print('データベースに保存中...')
+        Database().load_datasets()
+        print('完了')
+
+    # 納品ファイル
+    if (EXCEL_PARALLEL):
+        print('衆議院・参議院の納品ファイルを生成中...')
+        with ProcessPoolExecutor(max_workers=2, mp_context=get_context(PROCESS_START_METHOD)) as excel_executor:
+            excel_futures = [
+                excel_executor.submit(generate_excel, True, SHUGIIN_OUTPUT_FILE_NAME),
+                excel_executor.submit(generate_excel, False, SANGIIN_OUTPUT_FILE_NAME)]
+            for excel_future in excel_futures:
+                print(f'{excel_future.result()} 完了')
+    else:
+        print('衆議院の納品ファイルを生成中...')
+        generate_excel(True, SHUGIIN_OUTPUT_FILE_NAME)
+        print('完了')
+
+        print('参議院の納品ファイルを生成中...')
+        generate_excel(False, SANGIIN_OUTPUT_FILE_NAME)
         print('完了')
 
-# 納品ファイル
-print('衆議院の納品ファイルを生成中...')
-shugiin_excel_generator = ShugiinExcelGenerator()
-shugiin_excel_generator.generate(SHUGIIN_OUTPUT_FILE_NAME)
-print('完了')
 
-print('参議院の納品ファイルを生成中...')
-sangiin_excel_generator = SangiinExcelGenerator()
-sangiin_excel_generator.generate(SANGIIN_OUTPUT_FILE_NAME)
-print('完了')
\ No newline at end of file
+# 解析・納品ファイル生成のプロセスは spawn で起動するとこのモジュールを読み直すので、直接実行した時だけ動かす
+if __name__ == '__main__':
+    main()
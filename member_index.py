@@ -0,0 +1,126 @@
+import hashlib
+import re
+import unicodedata
+from collections import Counter
+from difflib import get_close_matches
+from functools import lru_cache
+import pandas as pd
+
+from config import\
+    MEMBER_NAME_ITAIJI,\
+    MEMBER_NAME_SUFFIX_PATTERN,\
+    MEMBER_NAME_ALIASES,\
+    MEMBER_FUZZY_CUTOFF,\
+    MEMBER_CANDIDATE_CUTOFF,\
+    MEMBER_UNMATCHED_REPORT_LIMIT
+
+# 議員名から議員IDを引く索引
+# 発言一覧・主意書・議員立法はそれぞれ違う整形の名前を持つので、照合用のキーに揃えてからIDにする
+# IDはキーのハッシュから作るので、実行や院が変わっても同じ議員は同じIDになる
+# 結合は文字列ではなくIDの整数列で行う
+
+ITAIJI_TABLE = str.maketrans(MEMBER_NAME_ITAIJI)
+NAME_SUFFIX_PATTERN = re.compile(MEMBER_NAME_SUFFIX_PATTERN)
+MEMBER_ID_COLUMN = 'member_id'
+
+
+@lru_cache(maxsize=None)
+def normalize_name(name: str) -> str:
+    # 全角半角を揃え、空白 (U+3000を含む) を除き、異体字と末尾の敬称を落とす
+    key = ''.join(unicodedata.normalize('NFKC', name).split()).translate(ITAIJI_TABLE)
+    return NAME_SUFFIX_PATTERN.sub('', key)
+
+
+def get_member_id(key: str) -> int:
+    # int64 に収まる正の整数
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big') >> 1
+
+
+class MemberIndex:
+    def __init__(self, members_df: pd.DataFrame, name_column: str, aliases=MEMBER_NAME_ALIASES,
+                 fuzzy_cutoff=MEMBER_FUZZY_CUTOFF, candidate_cutoff=MEMBER_CANDIDATE_CUTOFF):
+        self.name_column = name_column
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.candidate_cutoff = candidate_cutoff
+        self.member_ids: dict[str, int] = {}
+        for name in members_df[name_column].dropna():
+            key = normalize_name(name)
+            self.member_ids.setdefault(key, get_member_id(key))
+        for alias, name in aliases.items():
+            key = normalize_name(name)
+            if (key in self.member_ids):
+                self.member_ids.setdefault(normalize_name(alias), self.member_ids[key])
+        self.__keys = list(self.member_ids.keys())
+        self.__fuzzy_keys: dict[str, str | None] = {}
+        self.__candidate_keys: dict[str, str | None] = {}
+        self.unmatched: dict[str, Counter] = {}
+        self.fuzzy_matched: dict[str, dict[str, str]] = {}
+
+    def get_members_by_id(self, members_df: pd.DataFrame) -> pd.DataFrame:
+        # 議員一覧に member_id の列を足し、名前の列を落とす。同じ議員の行は最初の1行にする
+        names = members_df[self.name_column]
+        member_ids = pd.Series(
+            {name: get_member_id(normalize_name(name)) for name in names.dropna().unique()}, dtype='Int64')
+        return members_df.assign(**{MEMBER_ID_COLUMN: names.map(member_ids)}).dropna(
+            subset=[MEMBER_ID_COLUMN]).drop_duplicates(MEMBER_ID_COLUMN).drop(columns=[self.name_column])
+
+    def get_member_ids(self, names: pd.Series, source: str) -> pd.Series:
+        # 同じ名前は一度だけ照合する。一致しない名前は source 毎に数えておく
+        # IDは float を経由すると桁が落ちるので、Int64 のSeriesで引く
+        member_ids = pd.Series({name: self.__lookup(name, source) for name in names.dropna().unique()}, dtype='Int64')
+        unmatched = self.unmatched.setdefault(source, Counter())
+        for name, count in names.value_counts().items():
+            if (pd.isna(member_ids[name])):
+                unmatched[name] += count
+        return names.map(member_ids)
+
+    def __lookup(self, name: str, source: str) -> int | None:
+        key = normalize_name(name)
+        if (not key):
+            return None
+        if (key in self.member_ids):
+            return self.member_ids[key]
+        fuzzy_key = self.__get_fuzzy_key(key)
+        if (fuzzy_key is None):
+            return None
+        self.fuzzy_matched.setdefault(source, {})[name] = fuzzy_key
+        return self.member_ids[fuzzy_key]
+
+    def __get_fuzzy_key(self, key: str) -> str | None:
+        # 一字違いの別の議員を結合しないよう、文字数が同じ名前だけを対象にする
+        if (self.fuzzy_cutoff >= 1):
+            return None
+        if (key not in self.__fuzzy_keys):
+            same_length_keys = [member_key for member_key in self.__keys if len(member_key) == len(key)]
+            matches = get_close_matches(key, same_length_keys, n=1, cutoff=self.fuzzy_cutoff)
+            self.__fuzzy_keys[key] = matches[0] if matches else None
+        return self.__fuzzy_keys[key]
+
+    def get_candidate_key(self, name: str) -> str | None:
+        # 一致しなかった名前に最も近い議員。結合には使わず、報告に出して別名に足すかを判断する
+        key = normalize_name(name)
+        if (key not in self.__candidate_keys):
+            matches = get_close_matches(key, self.__keys, n=1, cutoff=self.candidate_cutoff)
+            self.__candidate_keys[key] = matches[0] if matches else None
+        return self.__candidate_keys[key]
+
+    def get_unmatched_df(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            [(source, name, count, self.get_candidate_key(name))
+             for source, unmatched in self.unmatched.items() for name, count in unmatched.most_common()],
+            columns=['source', 'name', 'count', 'candidate'])
+
+    def print_report(self, limit=MEMBER_UNMATCHED_REPORT_LIMIT):
+        for source, fuzzy_matched in self.fuzzy_matched.items():
+            for name, key in fuzzy_matched.items():
+                print(f'{source}: {name} を {key} とみなしました。')
+        for source, unmatched in self.unmatched.items():
+            if (not unmatched):
+                continue
+            names = ', '.join(f'{name}({count})' for name, count in unmatched.most_common(limit))
+            print(f'{source}: 議員と一致しない名前が{len(unmatched)}件あります。{names}')
+            candidates = ', '.join(
+                f'{name} → {candidate_key}' for name, candidate_key in
+                ((name, self.get_candidate_key(name)) for name, _ in unmatched.most_common(limit)) if candidate_key)
+            if (candidates):
+                print(f'{source}: 近い名前の議員 (別名に足す場合は MEMBER_NAME_ALIASES へ): {candidates}')
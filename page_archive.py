@@ -0,0 +1,194 @@
+import hashlib
+import mmap
+import os
+import zlib
+from threading import Lock
+from time import time
+from urllib.parse import urlparse
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from config import PAGE_ARCHIVE_DIR, PAGE_ARCHIVE_SOURCES
+
+# 取得したページの生のHTMLを取得元毎の追記専用のパックファイルに圧縮して残す
+# パーサーを直した後に、サイトを取り直さずにページクラスを走らせ直すためのもの
+# <source>.pack: 圧縮した本文を追記していく
+# <source>.idx: 1行1ページで「取得時刻 位置 長さ ハッシュ Content-Type URL」をタブ区切りで追記する
+# <source>.dict: 最初に保存したページの先頭。同じサイトのページは共通部分が多いので、圧縮の辞書に使う
+
+ZDICT_SIZE = 32 * 1024
+COMPRESS_LEVEL = 9
+OTHER_SOURCE = 'other'
+
+
+class ArchiveRecord:
+    def __init__(self, url, fetched_at, offset, length, content_hash, content_type):
+        self.url = url
+        self.fetched_at = fetched_at
+        self.offset = offset
+        self.length = length
+        self.content_hash = content_hash
+        self.content_type = content_type
+
+    def to_index_line(self) -> str:
+        return f'{self.fetched_at}\t{self.offset}\t{self.length}\t{self.content_hash}\t{self.content_type}\t{self.url}\n'
+
+    @classmethod
+    def from_index_line(cls, line: str):
+        fetched_at, offset, length, content_hash, content_type, url = line.rstrip('\n').split('\t', 5)
+        return cls(url, float(fetched_at), int(offset), int(length), content_hash, content_type)
+
+    def to_response(self, content: bytes) -> Response:
+        response = Response()
+        response.status_code = 200
+        response.url = self.url
+        response._content = content
+        response.headers = CaseInsensitiveDict()
+        if (self.content_type):
+            response.headers['Content-Type'] = self.content_type
+        return response
+
+
+class ArchivePack:
+    def __init__(self, archive_dir: str, source: str):
+        self.pack_path = os.path.join(archive_dir, source + '.pack')
+        self.index_path = os.path.join(archive_dir, source + '.idx')
+        self.dict_path = os.path.join(archive_dir, source + '.dict')
+        self.__lock = Lock()
+        self.__zdict = self.__load_zdict()
+        self.__pack_size = os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0
+        self.records: dict[str, list[ArchiveRecord]] = self.__load_index()
+        self.__mmap = None
+        self.__mmap_size = 0
+
+    def __load_zdict(self) -> bytes | None:
+        if (os.path.exists(self.dict_path)):
+            with open(self.dict_path, 'rb') as f:
+                return f.read()
+
+    def __load_index(self) -> dict[str, list[ArchiveRecord]]:
+        records = {}
+        if (not os.path.exists(self.index_path)):
+            self.__pack_size = 0
+            return records
+        pack_size = self.__pack_size
+        self.__pack_size = 0
+        index_size = 0
+        with open(self.index_path, 'rb') as f:
+            for line in f:
+                # 書き込み途中で落ちた行と、パックに本文が無い行から後は捨てる
+                if (not line.endswith(b'\n')):
+                    break
+                record = ArchiveRecord.from_index_line(line.decode('utf-8'))
+                if (record.offset + record.length > pack_size):
+                    break
+                records.setdefault(record.url, []).append(record)
+                self.__pack_size = record.offset + record.length
+                index_size += len(line)
+        if (os.path.getsize(self.index_path) > index_size):
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(index_size)
+        return records
+
+    def lookup(self, url: str, fetched_before: float | None = None) -> ArchiveRecord | None:
+        # 指定がなければ最新の版を返す
+        for record in reversed(self.records.get(url, [])):
+            if (fetched_before is None or record.fetched_at <= fetched_before):
+                return record
+
+    def read(self, record: ArchiveRecord) -> bytes:
+        with self.__lock:
+            if (self.__mmap_size < record.offset + record.length):
+                self.__remap()
+            compressed = self.__mmap[record.offset:record.offset + record.length]
+        decompressor = zlib.decompressobj(zdict=self.__zdict) if self.__zdict else zlib.decompressobj()
+        return decompressor.decompress(compressed) + decompressor.flush()
+
+    def __remap(self):
+        if (self.__mmap):
+            self.__mmap.close()
+        with open(self.pack_path, 'rb') as f:
+            self.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__mmap_size = len(self.__mmap)
+
+    def append(self, url: str, content: bytes, content_type: str | None, fetched_at: float) -> ArchiveRecord | None:
+        content_hash = hashlib.sha256(content).hexdigest()
+        with self.__lock:
+            latest_record = self.lookup(url)
+            # 前回から変わっていないページは追記しない
+            if (latest_record and latest_record.content_hash == content_hash):
+                return None
+            if (self.__zdict is None):
+                self.__save_zdict(content[:ZDICT_SIZE])
+            compressor = zlib.compressobj(COMPRESS_LEVEL, zdict=self.__zdict)
+            compressed = compressor.compress(content) + compressor.flush()
+            # パックを書いてから索引を書く。索引を書く前に落ちた分はパックの末尾で上書きされる
+            with open(self.pack_path, 'r+b' if os.path.exists(self.pack_path) else 'wb') as f:
+                f.seek(self.__pack_size)
+                f.write(compressed)
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            record = ArchiveRecord(url, fetched_at, self.__pack_size, len(compressed), content_hash, content_type or '')
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(record.to_index_line())
+            self.__pack_size += len(compressed)
+            self.records.setdefault(url, []).append(record)
+            return record
+
+    def __save_zdict(self, zdict: bytes):
+        tmp_path = self.dict_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(zdict)
+        os.replace(tmp_path, self.dict_path)
+        self.__zdict = zdict
+
+    def close(self):
+        with self.__lock:
+            if (self.__mmap):
+                self.__mmap.close()
+                self.__mmap = None
+                self.__mmap_size = 0
+
+
+class PageArchive:
+    def __init__(self, archive_dir=PAGE_ARCHIVE_DIR, sources=PAGE_ARCHIVE_SOURCES):
+        self.archive_dir = archive_dir
+        self.sources = sources
+        os.makedirs(archive_dir, exist_ok=True)
+        self.__lock = Lock()
+        self.__packs: dict[str, ArchivePack] = {}
+
+    def get_source(self, url: str) -> str:
+        parsed_url = urlparse(url)
+        host_path = parsed_url.netloc + parsed_url.path
+        for source, url_prefix in self.sources.items():
+            if (host_path.startswith(url_prefix)):
+                return source
+        return OTHER_SOURCE
+
+    def get_pack(self, source: str) -> ArchivePack:
+        with self.__lock:
+            if (source not in self.__packs):
+                self.__packs[source] = ArchivePack(self.archive_dir, source)
+            return self.__packs[source]
+
+    def lookup(self, url: str, fetched_before: float | None = None) -> ArchiveRecord | None:
+        return self.get_pack(self.get_source(url)).lookup(url, fetched_before)
+
+    def read(self, record: ArchiveRecord) -> bytes:
+        return self.get_pack(self.get_source(record.url)).read(record)
+
+    def get_response(self, url: str, fetched_before: float | None = None) -> Response | None:
+        record = self.lookup(url, fetched_before)
+        if (record):
+            return record.to_response(self.read(record))
+
+    def store(self, url: str, response: Response) -> ArchiveRecord | None:
+        return self.get_pack(self.get_source(url)).append(
+            url, response.content, response.headers.get('Content-Type'), time())
+
+    def close(self):
+        with self.__lock:
+            for pack in self.__packs.values():
+                pack.close()
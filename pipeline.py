@@ -0,0 +1,86 @@
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import get_context
+from threading import BoundedSemaphore
+
+from config import PIPELINE_FETCH_WORKERS, PIPELINE_PARSE_WORKERS, PIPELINE_QUEUE_SIZE, PROCESS_START_METHOD
+
+# 取得と解析を分けたパイプライン
+# 取得はスレッドで生のバイト列を取るだけにし、解析はコア数分のプロセスで行う
+# 取得済みで解析待ち・解析中のページは queue_size 件までに抑える
+# parse はプロセスに渡すので、モジュールの直下に定義した関数でなければならない
+
+
+class FetchParsePipeline:
+    def __init__(self, fetch_workers=PIPELINE_FETCH_WORKERS, parse_workers=PIPELINE_PARSE_WORKERS,
+                 queue_size=PIPELINE_QUEUE_SIZE):
+        self.fetch_workers = fetch_workers
+        # 0 の場合は取得したスレッドでそのまま解析する
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.__fetch_executor = None
+        self.__parse_executor = None
+        self.__in_flight = BoundedSemaphore(queue_size)
+
+    def __enter__(self):
+        if (self.parse_workers != 0):
+            # 親が開いたキャッシュのSQLite接続やロックを引き継がないよう、解析プロセスは spawn で起動する
+            self.__parse_executor = ProcessPoolExecutor(
+                max_workers=self.parse_workers, mp_context=get_context(PROCESS_START_METHOD))
+            # 起動に時間がかかるので、取得を始める前に解析プロセスを立ち上げておく
+            self.__parse_executor.submit(int).result()
+        self.__fetch_executor = ThreadPoolExecutor(max_workers=self.fetch_workers)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__fetch_executor.shutdown()
+        if (self.__parse_executor):
+            self.__parse_executor.shutdown()
+
+    def submit(self, fetch, parse, *args) -> Future:
+        # 解析結果が入るFutureを返す。処理中の件数が上限に達していれば空くまで待つ
+        self.__in_flight.acquire()
+        result_future = Future()
+        result_future.add_done_callback(lambda _: self.__in_flight.release())
+        fetch_future = self.__fetch_executor.submit(self.__fetch_and_parse, fetch, parse, args, result_future)
+        fetch_future.add_done_callback(lambda f: self.__forward_exception(f, result_future))
+        return result_future
+
+    def __fetch_and_parse(self, fetch, parse, args, result_future: Future):
+        content = fetch(*args)
+        if (self.__parse_executor is None):
+            result_future.set_result(parse(*args, content))
+            return
+        parse_future = self.__parse_executor.submit(parse, *args, content)
+        parse_future.add_done_callback(lambda f: self.__forward_result(f, result_future))
+
+    def __forward_result(self, source_future: Future, result_future: Future):
+        if (source_future.exception() is not None):
+            result_future.set_exception(source_future.exception())
+        else:
+            result_future.set_result(source_future.result())
+
+    def __forward_exception(self, fetch_future: Future, result_future: Future):
+        if (fetch_future.exception() is not None and not result_future.done()):
+            result_future.set_exception(fetch_future.exception())
+
+    def map(self, fetch, parse, items):
+        # 入力の順番で解析結果を返す
+        pending_futures = deque()
+        for item in items:
+            if (len(pending_futures) >= self.queue_size):
+                yield pending_futures.popleft().result()
+            pending_futures.append(self.submit(fetch, parse, item))
+        while (pending_futures):
+            yield pending_futures.popleft().result()
+
+
+def bounded_map(executor: Executor, fn, items, window: int):
+    # Executor.map と同じく入力の順番で結果を返すが、先に投入するのは window 件までにする
+    pending_futures = deque()
+    for item in items:
+        if (len(pending_futures) >= window):
+            yield pending_futures.popleft().result()
+        pending_futures.append(executor.submit(fn, item))
+    while (pending_futures):
+        yield pending_futures.popleft().result()
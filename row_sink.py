@@ -0,0 +1,94 @@
+import pandas as pd
+
+from config import CSV_CHUNK_ROWS
+
+# 収集した行を少しずつ受け取り、chunk_rows 行毎に解析して書き出し先に追記する
+# 解析が会議単位で行われる場合は group_column を指定すると、同じ会議の行を同じチャンクに入れる
+
+
+class CsvChunkWriter:
+    # DataFrame.to_csv と同じく、先頭に通し番号の列を持つCSVを書く
+    def __init__(self, path: str):
+        self.path = path
+        self.__rows_written = 0
+
+    def write(self, chunk_df: pd.DataFrame):
+        is_first = self.__rows_written == 0
+        chunk_df = chunk_df.set_axis(range(self.__rows_written, self.__rows_written + len(chunk_df)))
+        chunk_df.to_csv(self.path, mode='w' if is_first else 'a', header=is_first)
+        self.__rows_written += len(chunk_df)
+
+    def close(self):
+        pass
+
+
+class ChunkedRowSink:
+    def __init__(self, columns: list[str], writers: list, transform=None, group_column: str | None = None,
+                 chunk_rows=CSV_CHUNK_ROWS):
+        self.columns = columns
+        self.writers = writers
+        self.transform = transform
+        self.group_column = group_column
+        self.chunk_rows = chunk_rows
+        self.rows_written = 0
+        self.__buffer: list[tuple] = []
+        self.__group_index = columns.index(group_column) if group_column else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if (exc_type is None):
+            self.close()
+
+    def write_rows(self, rows: list[tuple]):
+        # rows は columns の順のタプル
+        self.__buffer.extend(rows)
+        if (len(self.__buffer) >= self.chunk_rows):
+            self.__flush(False)
+
+    def write_df(self, df: pd.DataFrame):
+        self.write_rows(list(df[self.columns].itertuples(index=False, name=None)))
+
+    def close(self):
+        self.__flush(True)
+        # 1行も無い場合も列だけは書く
+        if (self.rows_written == 0):
+            self.__write_chunk(self.__get_chunk_df([]))
+        for writer in self.writers:
+            writer.close()
+
+    def __flush(self, is_last: bool):
+        rows = self.__buffer
+        self.__buffer = []
+        if (not is_last and self.__group_index is not None):
+            # 最後の会議はまだ続きが来るかもしれないので次に回す
+            split_at = self.__get_last_group_begin(rows)
+            self.__buffer = rows[split_at:]
+            rows = rows[:split_at]
+        if (rows):
+            self.__write_chunk(self.__get_chunk_df(rows))
+
+    def __get_last_group_begin(self, rows: list[tuple]) -> int:
+        last_group = rows[-1][self.__group_index]
+        split_at = len(rows)
+        while (split_at > 0 and rows[split_at - 1][self.__group_index] == last_group):
+            split_at -= 1
+        return split_at
+
+    def __get_chunk_df(self, rows: list[tuple]) -> pd.DataFrame:
+        chunk_df = pd.DataFrame(rows, columns=self.columns)
+        if (self.transform):
+            chunk_df = self.transform(chunk_df)
+        return chunk_df
+
+    def __write_chunk(self, chunk_df: pd.DataFrame):
+        for writer in self.writers:
+            writer.write(chunk_df)
+        self.rows_written += len(chunk_df)
+
+
+class ChunkedCsvSink(ChunkedRowSink):
+    def __init__(self, path: str, columns: list[str], transform=None, group_column: str | None = None,
+                 chunk_rows=CSV_CHUNK_ROWS):
+        super().__init__(columns, [CsvChunkWriter(path)], transform, group_column, chunk_rows)
@@ -1,12 +1,24 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from time import sleep
 from pprint import pprint
-import requests
 from bs4 import BeautifulSoup
 import re
 import pandas as pd
 
-from config import SID_BEGIN, SID_END, MEETING_TERM
+from config import\
+    SID_BEGIN,\
+    SID_END,\
+    SID_CHUNK_SIZE,\
+    SID_EMPTY_RUN_LIMIT,\
+    SANGIIN_MAX_WORKERS,\
+    MEETING_TERM
+from http_client import get_page, get_shared_client, PageFetchError
+from html_parser import parse_html
+from checkpoint import CrawlCheckpoint
+from columnar import ColumnarBuilder
+from row_sink import ChunkedCsvSink
+from pipeline import FetchParsePipeline
+from speaker_parser import parse_sangiin_speakers
 
 # https://www.webtv.sangiin.go.jp/webtv/detail.php?sid=6637
 # 2022年度最初の国会
@@ -16,7 +28,14 @@ from config import SID_BEGIN, SID_END, MEETING_TERM
 
 URL_BASE = "https://www.webtv.sangiin.go.jp/webtv/detail.php?sid="
 
+# 発言一覧の列
+MEETING_ROW_COLUMNS = ["meeting_date", "meeting_name", "meeting_content", "name_attr", "start_href",
+                       "meeting_duration", "meeting_url"]
+MEETING_INTERNED_COLUMNS = ["meeting_name", "meeting_content", "name_attr", "meeting_url"]
+
 class MeetingInfo:
+    __slots__ = ('meeting_date', 'meeting_name', 'meeting_content', 'meeting_duration')
+
     def __init__(self, meeting_date, meeting_name: str, meeting_content: str, meeting_duration: timedelta):
         self.meeting_date = meeting_date,
         self.meeting_name = meeting_name,
@@ -25,34 +44,21 @@ class MeetingInfo:
 
 
 class Speach:
-    def __init__(self, name: str, attributes: list[str], time_min: int):
-        self.speaker = Speaker(name, attributes)
-        self.time_min = time_min
+    # 氏名・属性と発言時間は speaker_parser で収集全体をまとめて解析する
+    __slots__ = ('name_attr', 'start_href')
 
-
-class Speaker:
-    def __init__(self, name: str, attriubutes: list[str]):
-        self.name = name
-        self.attributes = attriubutes
+    def __init__(self, name_attr: str, start_href: str):
+        self.name_attr = name_attr
+        self.start_href = start_href
 
 
 class Meeting:
-    def __init__(self, meeting_info: MeetingInfo, speaches: list[Speach]):
+    __slots__ = ('info', 'speaches', 'url')
+
+    def __init__(self, meeting_info: MeetingInfo, speaches: list[Speach], url: str):
         self.info = meeting_info
-        self.speaches = self.calculate_speaking_time(speaches)
-
-    def calculate_speaking_time(self, speaches: list[Speach]) -> list[Speach]:
-        calculated_speaches: list[Speach] = []
-        for speaker_num, speach in enumerate(speaches):
-            speach_duration = None
-            next_speaker_num = speaker_num + 1
-            if (next_speaker_num < len(speaches)):
-                speach_duration =  speaches[next_speaker_num].time_min - speach.time_min
-            else:
-                speach_duration = self.info.meeting_duration - speaches[speaker_num].time_min
-            calculated_speach = Speach(speach.speaker.name, speach.speaker.attributes, speach_duration)
-            calculated_speaches.append(calculated_speach)
-        return calculated_speaches
+        self.speaches = speaches
+        self.url = url
 
 
 class MeetingInfoPage:
@@ -77,7 +83,7 @@ class MeetingInfoPage:
 
     def __get_meeting(self):
         return Meeting(
-            self.__meeting_info, self.__speaches)
+            self.__meeting_info, self.__speaches, self.url)
 
     def __get_meeting_info(self):
         return MeetingInfo(self.__meeting_date, self.__meeting_name, self.__meeting_contents, self.__meeting_duration)
@@ -97,13 +103,7 @@ class MeetingInfoPage:
     def __generate_speach(self, speaker_time: BeautifulSoup):
         time_raw = speaker_time.get('href')
         speaker_name_attr_raw = speaker_time.text
-
-        speaking_time = self.__get_time(time_raw)
-        name = self.__get_name(speaker_name_attr_raw)
-        attributes = self.__get_speaker_attributes(
-            speaker_name_attr_raw)
-
-        return Speach(name, attributes, speaking_time)
+        return Speach(speaker_name_attr_raw, time_raw)
 
     def __get_detail_contents(self) -> BeautifulSoup | None:
         detail_contents = self.meeting_page_bs.find(
@@ -145,87 +145,139 @@ class MeetingInfoPage:
         duration_sec = timedelta(hours=hours, minutes=minutes).seconds
         return round(duration_sec/60)
 
-    def __get_time(self, time_raw):
-        href_time_sec = time_raw.replace("#", "")
-        href_time_min = float(href_time_sec) / 60
-        rounded = round(href_time_min)
-        return rounded
 
-    def __get_name(self, speaker_name_attr: str):
-        return re.sub("\(.+?\)", "", speaker_name_attr)
+# 取得はスレッドでバイト列を取るだけにし、解析はプロセスで行うので
+# 解析の関数はモジュールの直下に置き、BeautifulSoupを含まない Meeting を返す
+def fetch_meeting_page(url: str) -> bytes | None:
+    # 404は会議の無いsidとして None を返す。5xx・接続エラーは再試行しても駄目なら例外にし、空のsidとして扱わない
+    pprint(url + " を取得中")
+    meeting_page_response = get_page(url)
+    if (meeting_page_response.status_code == 200):
+        return meeting_page_response.content
+    if (meeting_page_response.status_code == 404):
+        pprint("ページが見つかりませんでした。")
+        return None
+    raise PageFetchError(url, meeting_page_response.status_code)
+
 
-    def __get_speaker_attributes(self, speaker_name_attr: str):
-        attributes_str = re.search(
-            "(?<=\().+?(?=\))", speaker_name_attr).group().replace('\u3000', '、')
-        return ", ".join(attributes_str.split('、'))
+def parse_meeting_page(url: str, content: bytes | None) -> Meeting | None:
+    if (content is None):
+        return None
+    meeting_info_page = MeetingInfoPage(url, parse_html(content))
+    if (meeting_info_page.has_contents):
+        return meeting_info_page.meeting
+    pprint("ページコンテンツが見つかりませんでした。")
+    return None
 
 
 class MeetingDownloader:
     def __init__(self, url: str):
         self.url = url
-        self.__meeting_page_response = requests.get(url)
-        self.meeting_info_page = self.__get_meeting_info_page()
-
-
-    def __get_meeting_info_page(self):
-        pprint(self.url + " を取得中")
-        if (self.__meeting_page_response.status_code == 200):
-            meeting_page_bs = BeautifulSoup(
-                self.__meeting_page_response.content, "html.parser")
-            meeting_info_page = MeetingInfoPage(self.url, meeting_page_bs)
-            if (meeting_info_page.has_contents):
-                return meeting_info_page
-            else:
-                pprint("ページコンテンツが見つかりませんでした。")
-        else:
-            pprint("ページが見つかりませんでした。")
+        self.meeting = parse_meeting_page(url, fetch_meeting_page(url))
 
 
 class MeetingsDownloader:
-    def __init__(self):
-        self.meeting_info_page_list = self.__get_meeting_info_page()
-        self.meeting_info_list_dict = self.__get_meeting_info_dicts()
-        self.meeting_dict_list = self.__get_meeting_dict_list()
-        self.meetings_df = pd.DataFrame(self.meeting_dict_list)
-
-    def __get_meeting_info_page(self) -> list[MeetingInfoPage]:
-        meeting_info_list = []
-        for i in range(SID_END - SID_BEGIN + 1):
-            url = URL_BASE + str(SID_BEGIN + i)
-            meeting_downloader = MeetingDownloader(url)
-            if (meeting_downloader.meeting_info_page):
-                meeting_info_list.append(meeting_downloader.meeting_info_page)
-            #sleep(1)
-        return meeting_info_list
-
-    def __get_meeting_info_dicts(self) -> list[dict]:
-        return [{
-            "meeting_name": meeting_info_page.meeting.info.meeting_name,
-            "meeting_date": meeting_info_page.meeting.info.meeting_date,
-            "meeting_content": meeting_info_page.meeting.info.meeting_content,
-            "speaches": [{
-                "name": speach.speaker.name,
-                "attributes": speach.speaker.attributes,
-                "time_min": speach.time_min
-            } for speach in meeting_info_page.meeting.speaches]
-        } for meeting_info_page in self.meeting_info_page_list]
-
-    def __get_meeting_dict_list(self) -> list[dict]:
-        meeting_dict_list = []
-        for meeting_info_page in self.meeting_info_page_list:
-            for speach in meeting_info_page.meeting.speaches:
-                meeting_dict_list.append({
-                    "meeting_date": meeting_info_page.meeting.info.meeting_date[0],
-                    "meeting_name": "".join(meeting_info_page.meeting.info.meeting_name),
-                    "meeting_content": meeting_info_page.meeting.info.meeting_content,
-                    "name": speach.speaker.name,
-                    "attributes": speach.speaker.attributes,
-                    "time_min": speach.time_min
-                })
-        return meeting_dict_list
+    def __init__(self, sid_begin=SID_BEGIN, sid_end=SID_END, max_workers=SANGIIN_MAX_WORKERS,
+                 checkpoint: CrawlCheckpoint | None = None, stream=False):
+        self.checkpoint = checkpoint
+        self.sid_begin = self.__get_resume_sid(sid_begin)
+        self.sid_end = sid_end
+        self.max_workers = max_workers
+        self.last_sid = None
+        self.meeting_count = 0
+        # 記録先が無い場合はすべての行を、ある場合は記録しなかった当日以降の会議の行だけを溜める
+        self.meeting_rows = ColumnarBuilder(MEETING_ROW_COLUMNS, MEETING_INTERNED_COLUMNS)
+        # streamの場合は取得せず、iter_row_batches か write_rows で少しずつ受け取る
+        if (stream):
+            return
+        self.download()
+        self.meetings_df = self.__get_meetings_df()
+
+    def __get_resume_sid(self, sid_begin: int) -> int:
+        # 記録済みでない最初のsidから取得する。それより後の記録済みのsidは取得の時に飛ばす
+        sid = sid_begin
+        while (self.__is_completed(sid)):
+            sid += 1
+        return sid
+
+    def __is_completed(self, sid: int) -> bool:
+        return self.checkpoint is not None and self.checkpoint.is_completed(sid)
+
+    def __get_meetings_df(self) -> pd.DataFrame:
+        if (self.checkpoint is None):
+            return parse_sangiin_speakers(self.meeting_rows.to_df())
+        # 記録済みの行に、今回記録しなかった当日以降の会議の行を加える
+        return parse_sangiin_speakers(pd.concat([self.checkpoint.load_rows(), self.meeting_rows.to_df()], ignore_index=True))
+
+    def __iter_sids(self):
+        sid = self.sid_begin
+        while (self.sid_end is None or sid <= self.sid_end):
+            yield sid
+            sid += 1
+
+    def download(self):
+        for sid, meeting_rows in self.iter_row_batches():
+            if (not self.__is_completed(sid)):
+                self.meeting_rows.extend(meeting_rows)
+
+    def iter_row_batches(self):
+        # sidの順に、1会議分の行 (MEETING_ROW_COLUMNS の順のタプル) を取得し終えるたびに返す
+        # 取得はスレッド・解析はプロセスで行い、結果を受け取りながら SID_CHUNK_SIZE 件先のsidまで取得を進める
+        # SID_ENDがNoneの場合は空ページ・404が続いたところを終端とする
+        empty_run = 0
+        with FetchParsePipeline(fetch_workers=self.max_workers, queue_size=SID_CHUNK_SIZE) as pipeline:
+            urls = (URL_BASE + str(sid) for sid in self.__iter_sids() if not self.__is_completed(sid))
+            meetings = pipeline.map(fetch_meeting_page, parse_meeting_page, urls)
+            try:
+                for sid in self.__iter_sids():
+                    # 記録済みのsidは会議のあるsidなので、終端の判定では空として数えない
+                    if (self.__is_completed(sid)):
+                        self.last_sid = sid
+                        empty_run = 0
+                        continue
+                    meeting = next(meetings)
+                    if (meeting):
+                        self.meeting_count += 1
+                        self.last_sid = sid
+                        empty_run = 0
+                        meeting_rows = self.__get_meeting_rows(meeting)
+                        meeting_date = meeting.info.meeting_date[0]
+                        # 当日以降の会議のページはまだ更新されうるので、キャッシュでは再検証させ、記録しない
+                        get_shared_client().set_page_date(meeting.url, meeting_date)
+                        if (self.checkpoint and meeting_date < date.today()):
+                            self.checkpoint.commit(sid, [dict(zip(MEETING_ROW_COLUMNS, row)) for row in meeting_rows])
+                        yield (sid, meeting_rows)
+                    else:
+                        # 会議がまだ載っていないページは、次の実行でもキャッシュから返さず再検証させる
+                        get_shared_client().set_page_date(URL_BASE + str(sid), date.today())
+                        empty_run += 1
+                        if (self.sid_end is None and empty_run >= SID_EMPTY_RUN_LIMIT):
+                            print(f"sid={self.last_sid} を終端とみなしました。")
+                            break
+            finally:
+                # 先読みして終端より後を取得中のページは、パイプラインを閉じる時に待つ
+                meetings.close()
+
+    def write_rows(self, meeting_sink: ChunkedCsvSink):
+        # 前回までに記録した行を書き出してから、取得した会議の行を順に書き出す
+        if (self.checkpoint):
+            for rows_df in self.checkpoint.iter_rows():
+                meeting_sink.write_df(rows_df)
+        for _, meeting_rows in self.iter_row_batches():
+            meeting_sink.write_rows(meeting_rows)
+
+    def __get_meeting_rows(self, meeting: Meeting) -> list[tuple]:
+        # MEETING_ROW_COLUMNS の順
+        meeting_date = meeting.info.meeting_date[0]
+        meeting_name = "".join(meeting.info.meeting_name)
+        return [(meeting_date, meeting_name, meeting.info.meeting_content, speach.name_attr, speach.start_href,
+                 meeting.info.meeting_duration, meeting.url)
+                for speach in meeting.speaches]
 
 
 class UpperHouseMember:
+    __slots__ = ('name', 'name_kana', 'party')
+
     def __init__(self, name, name_kana, party):
         self.name = name
         self.name_kana = name_kana
@@ -247,7 +299,7 @@ class UpperHouseMembersPage:
             name = "".join(name_raw.split())
             name_kana_raw = upper_house_member_row_contents[1].text
             name_kana = name_kana_raw.replace('\u3000', " ")
-            party = upper_house_member_row_contents[2].text
+            party = upper_house_member_row_contents[2].text.strip()
 
             if ('[' in name):
                 current_name, past_name = name.replace("]", "").split('[')
@@ -261,9 +313,8 @@ class UpperHouseMembersPage:
 class UpperHouseMembersDownloader:
     def __init__(self):
         url = "https://www.sangiin.go.jp/japanese/joho1/kousei/giin/"+str(MEETING_TERM)+"/giin.htm"
-        upper_house_members_response = requests.get(url)
-        upper_house_members_bs = BeautifulSoup(
-            upper_house_members_response.content, 'html.parser')
+        upper_house_members_response = get_page(url)
+        upper_house_members_bs = parse_html(upper_house_members_response.content)
         self.upper_house_members_page = UpperHouseMembersPage(upper_house_members_bs)
         self.upper_house_dict_list = self.__get_upper_house_member_dict_list()
         self.upper_house_members_df = pd.DataFrame(self.upper_house_dict_list)
@@ -272,4 +323,5 @@ class UpperHouseMembersDownloader:
         return [{
             "name": member.name,
             "name_kana": member.name_kana,
+            "party": member.party
         } for member in self.upper_house_members_page.members]
\ No newline at end of file
@@ -0,0 +1,348 @@
+import sqlite3
+import pandas as pd
+
+from config import\
+    SEARCH_INDEX_PATH,\
+    MEETING_TERM
+from houses import SHUGIIN, SANGIIN, get_sangiin_sid
+from dataset_store import dataset_exists, read_dataset
+from member_index import normalize_name
+from speech_rollups import SpeechRollups
+
+# 会議名・案件・主意書の件名・議員立法の法律案名の全文検索索引
+# SQLiteのFTS5をtrigramトークナイザで使い、分かち書きなしで日本語の部分一致を索引から引く
+# 中間データの書き出しと同時に行を取り込み、同じ行は何度取り込んでも増えない
+# 2文字以下の語はtrigramで引けないので、その語だけLIKEで絞り込む
+
+MIN_MATCH_LENGTH = 3
+
+
+class SearchResults:
+    __slots__ = ('speeches', 'speaker_totals', 'questions', 'bills')
+
+    def __init__(self, speeches: pd.DataFrame, speaker_totals: pd.DataFrame, questions: pd.DataFrame, bills: pd.DataFrame):
+        self.speeches = speeches
+        self.speaker_totals = speaker_totals
+        self.questions = questions
+        self.bills = bills
+
+
+class SearchIndexWriter:
+    # ChunkedRowSink の書き出し先として、解析済みのチャンクをそのまま索引に入れる
+    def __init__(self, search_index, dataset_name: str):
+        self.search_index = search_index
+        self.dataset_name = dataset_name
+
+    def write(self, chunk_df: pd.DataFrame):
+        self.search_index.index_dataset(self.dataset_name, chunk_df)
+
+    def close(self):
+        pass
+
+
+class SearchIndex:
+    def __init__(self, path=SEARCH_INDEX_PATH):
+        self.path = path
+        self.__connection = sqlite3.connect(path)
+        self.__create_tables()
+        self.rollups = SpeechRollups(self.__connection)
+        self.__indexers = {
+            'shugiin_members': lambda df: self.index_members(SHUGIIN, df),
+            'sangiin_members': lambda df: self.index_members(SANGIIN, df),
+            'shugiin_meetings': lambda df: self.index_meetings(SHUGIIN, df),
+            'shugiin_government_speakers': self.index_shugiin_government_speakers,
+            'sangiin_meetings': lambda df: self.index_meetings(SANGIIN, df),
+            'shugiin_shuisho': lambda df: self.index_questions(SHUGIIN, df),
+            'sangiin_shuisho': lambda df: self.index_questions(SANGIIN, df),
+            'shugiin_rippou': lambda df: self.index_bills(SHUGIIN, df),
+            'sangiin_rippou': lambda df: self.index_bills(SANGIIN, df)
+        }
+
+    def __create_tables(self):
+        # 検索用の表は外部コンテンツのFTS5表とし、元の表の変更はトリガーで反映する
+        self.__connection.executescript(
+            '''CREATE TABLE IF NOT EXISTS meetings (
+                id INTEGER PRIMARY KEY,
+                house TEXT NOT NULL,
+                date TEXT NOT NULL,
+                name TEXT NOT NULL,
+                sid INTEGER NOT NULL,
+                topics TEXT,
+                UNIQUE (house, date, name, sid)
+            );
+            CREATE TABLE IF NOT EXISTS speeches (
+                id INTEGER PRIMARY KEY,
+                meeting_id INTEGER NOT NULL REFERENCES meetings (id),
+                role TEXT NOT NULL,
+                speaker TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                attributes TEXT,
+                time_min INTEGER,
+                speaker_key TEXT,
+                UNIQUE (meeting_id, role, speaker, seq)
+            );
+            CREATE INDEX IF NOT EXISTS speeches_speaker ON speeches (speaker);
+            CREATE TABLE IF NOT EXISTS members (
+                house TEXT NOT NULL,
+                name_key TEXT NOT NULL,
+                name TEXT NOT NULL,
+                party TEXT,
+                PRIMARY KEY (house, name_key)
+            );
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY,
+                house TEXT NOT NULL,
+                session INTEGER NOT NULL,
+                question_number INTEGER NOT NULL,
+                title TEXT,
+                submitter TEXT,
+                UNIQUE (house, session, question_number)
+            );
+            CREATE TABLE IF NOT EXISTS bills (
+                id INTEGER PRIMARY KEY,
+                bill_id TEXT NOT NULL UNIQUE,
+                house TEXT NOT NULL,
+                session INTEGER NOT NULL,
+                number TEXT,
+                title TEXT,
+                submitters TEXT
+            );'''
+            + self.__get_fts_script('meetings', ['name', 'topics'])
+            + self.__get_fts_script('questions', ['title', 'submitter'])
+            + self.__get_fts_script('bills', ['title', 'submitters']))
+        self.__add_speaker_keys()
+        self.__connection.commit()
+
+    def __add_speaker_keys(self):
+        # speaker_key の列が無い索引は、列を足して既存の発言を照合用のキーで埋める
+        columns = [row[1] for row in self.__connection.execute('PRAGMA table_info(speeches)')]
+        if ('speaker_key' in columns):
+            return
+        self.__connection.execute('ALTER TABLE speeches ADD COLUMN speaker_key TEXT')
+        speakers = [row[0] for row in self.__connection.execute('SELECT DISTINCT speaker FROM speeches')]
+        self.__connection.executemany(
+            'UPDATE speeches SET speaker_key = ? WHERE speaker = ?',
+            [(normalize_name(speaker), speaker) for speaker in speakers])
+
+    def __get_fts_script(self, table: str, columns: list[str]) -> str:
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{column}' for column in columns)
+        old_values = ', '.join(f'old.{column}' for column in columns)
+        return f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5 (
+                {column_list}, content='{table}', content_rowid='id', tokenize='trigram');
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {table}_fts (rowid, {column_list}) VALUES (new.id, {new_values});
+            END;
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            END;
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO {table}_fts (rowid, {column_list}) VALUES (new.id, {new_values});
+            END;'''
+
+    def close(self):
+        self.__connection.close()
+
+    def get_writers(self, dataset_name: str) -> list[SearchIndexWriter]:
+        # 索引に入れないデータセットは空
+        if (dataset_name not in self.__indexers):
+            return []
+        return [SearchIndexWriter(self, dataset_name)]
+
+    def index_dataset(self, dataset_name: str, df: pd.DataFrame):
+        self.__indexers[dataset_name](df)
+
+    def load_datasets(self):
+        # 出力済みの中間データから索引を作り直す。無いデータは飛ばす
+        for dataset_name in self.__indexers:
+            if (dataset_exists(dataset_name)):
+                print(f'{dataset_name} を索引に追加中')
+                self.index_dataset(dataset_name, read_dataset(dataset_name))
+
+    def index_meetings(self, house: str, meetings_df: pd.DataFrame):
+        # 衆議院は date, topics、参議院は meeting_date, meeting_content, meeting_url の列を持つ
+        if (house == SANGIIN):
+            meetings_df = meetings_df.assign(
+                date=meetings_df["meeting_date"],
+                topics=meetings_df["meeting_content"],
+                sid=meetings_df["meeting_url"].map(get_sangiin_sid))
+        else:
+            meetings_df = meetings_df.assign(sid=0)
+        self.__index_speeches(house, meetings_df.assign(role='member'), update_topics=True)
+
+    def index_shugiin_government_speakers(self, government_speakers_df: pd.DataFrame):
+        # 発言一覧に無い会議は案件なしで作る
+        self.__index_speeches(SHUGIIN, government_speakers_df.assign(sid=0, topics=None), update_topics=False)
+
+    def __index_speeches(self, house: str, speeches_df: pd.DataFrame, update_topics: bool):
+        # speeches_df は date, meeting_name, sid, topics, role, name と、あれば attributes, time_min の列を持つ
+        if (speeches_df.empty):
+            return
+        speeches_df = speeches_df.assign(
+            date=pd.to_datetime(speeches_df["date"]).dt.strftime('%Y-%m-%d'),
+            attributes=speeches_df["attributes"] if "attributes" in speeches_df.columns else None,
+            time_min=speeches_df["time_min"] if "time_min" in speeches_df.columns else None)
+        speeches_df = speeches_df.astype(object).where(speeches_df.notna(), None)
+        meeting_keys = ["date", "meeting_name", "sid"]
+        meeting_rows = speeches_df.drop_duplicates(meeting_keys)[meeting_keys + ["topics"]]
+        upsert_meeting = '''INSERT INTO meetings (house, date, name, sid, topics) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (house, date, name, sid) DO '''
+        if (update_topics):
+            # 案件が変わっていない会議は書き換えない (FTSの更新を避ける)
+            upsert_meeting += 'UPDATE SET topics = excluded.topics WHERE topics IS NOT excluded.topics'
+        else:
+            upsert_meeting += 'NOTHING'
+        with self.__connection:
+            self.__connection.executemany(
+                upsert_meeting, [(house, *row) for row in meeting_rows.itertuples(index=False, name=None)])
+            meeting_ids = self.__get_meeting_ids(house, list(meeting_rows["date"].unique()))
+            speech_rows = speeches_df.assign(
+                meeting_id=[meeting_ids[key] for key in zip(speeches_df["date"], speeches_df["meeting_name"], speeches_df["sid"])],
+                seq=speeches_df.groupby(meeting_keys + ["role", "name"], sort=False).cumcount())[
+                    ["meeting_id", "role", "name", "seq", "attributes", "time_min"]]
+            # 変わっていない発言は書き換えない (集計の更新を避ける)
+            self.__connection.executemany(
+                '''INSERT INTO speeches (meeting_id, role, speaker, seq, attributes, time_min, speaker_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (meeting_id, role, speaker, seq) DO UPDATE SET
+                    attributes = excluded.attributes, time_min = excluded.time_min
+                WHERE attributes IS NOT excluded.attributes OR time_min IS NOT excluded.time_min''',
+                [(meeting_id, role, name, int(seq), attributes, None if time_min is None else int(time_min),
+                  normalize_name(name))
+                 for meeting_id, role, name, seq, attributes, time_min in speech_rows.itertuples(index=False, name=None)])
+
+    def __get_meeting_ids(self, house: str, meeting_dates: list[str]) -> dict:
+        placeholders = ', '.join('?' for _ in meeting_dates)
+        rows = self.__connection.execute(
+            f'SELECT id, date, name, sid FROM meetings WHERE house = ? AND date IN ({placeholders})',
+            [house, *meeting_dates]).fetchall()
+        return {(date, name, sid): meeting_id for meeting_id, date, name, sid in rows}
+
+    def index_members(self, house: str, members_df: pd.DataFrame):
+        # 議員(衆議院) は name_kanji、議員(参議院) は name に氏名が入っている。政党別の集計に使う
+        name_column = "name_kanji" if "name_kanji" in members_df.columns else "name"
+        members_df = members_df.assign(party=members_df["party"] if "party" in members_df.columns else None)[
+            [name_column, "party"]].dropna(subset=[name_column])
+        with self.__connection:
+            self.__connection.executemany(
+                '''INSERT INTO members (house, name_key, name, party) VALUES (?, ?, ?, ?)
+                ON CONFLICT (house, name_key) DO UPDATE SET name = excluded.name, party = excluded.party
+                WHERE name IS NOT excluded.name OR party IS NOT excluded.party''',
+                [(house, normalize_name(name), name, party)
+                 for name, party in members_df.astype(object).where(members_df.notna(), None).itertuples(
+                     index=False, name=None)])
+
+    def index_questions(self, house: str, questions_df: pd.DataFrame, session=MEETING_TERM):
+        # 衆議院は 質問件名・提出者名、参議院は 件名・提出者 の列
+        title_column = "質問件名" if "質問件名" in questions_df.columns else "件名"
+        submitter_column = "提出者名" if "提出者名" in questions_df.columns else "提出者"
+        questions_df = questions_df[["質問番号", title_column, submitter_column]]
+        with self.__connection:
+            self.__connection.executemany(
+                '''INSERT INTO questions (house, session, question_number, title, submitter) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (house, session, question_number) DO UPDATE SET
+                    title = excluded.title, submitter = excluded.submitter
+                WHERE title IS NOT excluded.title OR submitter IS NOT excluded.submitter''',
+                [(house, session, int(number), title, submitter)
+                 for number, title, submitter in questions_df.astype(object).where(questions_df.notna(), None).itertuples(
+                     index=False, name=None)])
+
+    def index_bills(self, house: str, bills_df: pd.DataFrame, session=MEETING_TERM):
+        # 議員立法の行は1法案につき提出者の数だけあるので、提出者をまとめて1件にする
+        bills_df = bills_df.astype(object).where(bills_df.notna(), None).assign(bill_id=bills_df["bill_id"].astype(str))
+        bill_rows = [
+            (bill_id, house, session, group["提出番号"].iloc[0], group["法律案名"].iloc[0],
+             ', '.join(submitter for submitter in group["提出者"] if submitter))
+            for bill_id, group in bills_df.groupby("bill_id", sort=False)]
+        with self.__connection:
+            self.__connection.executemany(
+                '''INSERT INTO bills (bill_id, house, session, number, title, submitters) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (bill_id) DO UPDATE SET
+                    number = excluded.number, title = excluded.title, submitters = excluded.submitters
+                WHERE number IS NOT excluded.number OR title IS NOT excluded.title OR submitters IS NOT excluded.submitters''',
+                bill_rows)
+
+    def __get_match_conditions(self, table: str, columns: list[str], query: str) -> tuple[list[str], list]:
+        # 空白で区切った語をすべて含む行。3文字以上の語はFTS索引、それより短い語はLIKEで引く
+        conditions = []
+        params = []
+        for term in query.split():
+            if (len(term) >= MIN_MATCH_LENGTH):
+                conditions.append(f'{table}.id IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?)')
+                params.append('"' + term.replace('"', '""') + '"')
+            else:
+                like = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                conditions.append('(' + ' OR '.join(f"{table}.{column} LIKE ? ESCAPE '\\'" for column in columns) + ')')
+                params.extend(like for _ in columns)
+        return (conditions, params)
+
+    def __get_filter_conditions(self, table: str, house: str | None, date_from=None, date_to=None) -> tuple[list[str], list]:
+        conditions = []
+        params = []
+        if (house):
+            conditions.append(f'{table}.house = ?')
+            params.append(house)
+        if (date_from):
+            conditions.append('meetings.date >= ?')
+            params.append(str(date_from))
+        if (date_to):
+            conditions.append('meetings.date <= ?')
+            params.append(str(date_to))
+        return (conditions, params)
+
+    def __read_query(self, sql: str, params: list) -> pd.DataFrame:
+        return pd.read_sql_query(sql, self.__connection, params=params)
+
+    def search_speeches(self, query: str, house: str | None = None, date_from=None, date_to=None) -> pd.DataFrame:
+        # 会議名か案件に語を含む会議での発言
+        match_conditions, match_params = self.__get_match_conditions('meetings', ['name', 'topics'], query)
+        filter_conditions, filter_params = self.__get_filter_conditions('meetings', house, date_from, date_to)
+        return self.__read_query(
+            f'''SELECT meetings.house, meetings.date, meetings.name AS meeting_name, meetings.topics,
+                    speeches.role, speeches.speaker, speeches.attributes, speeches.time_min
+                FROM meetings JOIN speeches ON speeches.meeting_id = meetings.id
+                WHERE {' AND '.join(match_conditions + filter_conditions) or '1'}
+                ORDER BY meetings.date, speeches.id''',
+            match_params + filter_params)
+
+    def search_speaker_totals(self, query: str, house: str | None = None, date_from=None, date_to=None) -> pd.DataFrame:
+        # 発言者毎の合計発言時間 (分) の多い順
+        match_conditions, match_params = self.__get_match_conditions('meetings', ['name', 'topics'], query)
+        filter_conditions, filter_params = self.__get_filter_conditions('meetings', house, date_from, date_to)
+        return self.__read_query(
+            f'''SELECT meetings.house, speeches.role, speeches.speaker,
+                    COALESCE(SUM(speeches.time_min), 0) AS time_min,
+                    COUNT(*) AS speeches,
+                    COUNT(DISTINCT meetings.id) AS meetings
+                FROM meetings JOIN speeches ON speeches.meeting_id = meetings.id
+                WHERE {' AND '.join(match_conditions + filter_conditions) or '1'}
+                GROUP BY meetings.house, speeches.role, speeches.speaker
+                ORDER BY time_min DESC, speeches.speaker''',
+            match_params + filter_params)
+
+    def search_questions(self, query: str, house: str | None = None) -> pd.DataFrame:
+        match_conditions, match_params = self.__get_match_conditions('questions', ['title', 'submitter'], query)
+        filter_conditions, filter_params = self.__get_filter_conditions('questions', house)
+        return self.__read_query(
+            f'''SELECT house, session, question_number, title, submitter FROM questions
+                WHERE {' AND '.join(match_conditions + filter_conditions) or '1'}
+                ORDER BY house, session, question_number''',
+            match_params + filter_params)
+
+    def search_bills(self, query: str, house: str | None = None) -> pd.DataFrame:
+        match_conditions, match_params = self.__get_match_conditions('bills', ['title', 'submitters'], query)
+        filter_conditions, filter_params = self.__get_filter_conditions('bills', house)
+        return self.__read_query(
+            f'''SELECT house, session, bill_id, number, title, submitters FROM bills
+                WHERE {' AND '.join(match_conditions + filter_conditions) or '1'}
+                ORDER BY house, session, bill_id''',
+            match_params + filter_params)
+
+    def search(self, query: str, house: str | None = None, date_from=None, date_to=None) -> SearchResults:
+        return SearchResults(
+            self.search_speeches(query, house, date_from, date_to),
+            self.search_speaker_totals(query, house, date_from, date_to),
+            self.search_questions(query, house),
+            self.search_bills(query, house))
@@ -1,20 +1,37 @@
 from datetime import date, timedelta
 from time import sleep
 from pprint import pprint
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import bs4
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import re
 import pandas as pd
 
+from config import SHUGIIN_MAX_WORKERS, SHUGIIN_PIPELINED, SHUGIIN_PREFETCH_DAYS, HTML_RESTRICTED_PARSE, SHUGIIN_RESIGNED_MEMBERS
+from http_client import get_page_content
+from html_parser import parse_html
+from checkpoint import CrawlCheckpoint
+from columnar import ColumnarBuilder
+from pipeline import FetchParsePipeline, bounded_map
+from row_sink import ChunkedCsvSink
+from speaker_parser import parse_shugiin_speakers, parse_government_speakers
+
 # https://www.shugiintv.go.jp/jp/index.php?ex=VL&u_day=20210825
 # この中に日毎の本会議・委員会のリンクが入っているのでそれをスクレイピングする
 
 MEETINGS_URL_BASE = "https://www.shugiintv.go.jp/jp/"
 MEETINGS_PARAM_BASE = "ex=VL"
 
+# 検索ページは会議へのリンク、詳細ページは div#library2 の表しか読まないので、その部分だけを解析する
+MEETING_SEARCH_RESULTS_STRAINER = SoupStrainer("td", attrs={"class": "s14_24"}) if HTML_RESTRICTED_PARSE else None
+MEETING_DETAILS_STRAINER = SoupStrainer("div", id="library2") if HTML_RESTRICTED_PARSE else None
+
 class MeetingSearchResult:
-    def __init__(self, result_elm: bs4.element.Tag):
+    __slots__ = ('meeting_date', 'meeting_name', 'meeting_detail_url')
+
+    def __init__(self, result_elm: bs4.element.Tag, meeting_date: date):
+        self.meeting_date = meeting_date
         self.meeting_name = self.__get_meeting_name(result_elm)
         self.meeting_detail_url = self.__get_meeting_detail_url(result_elm)
 
@@ -28,11 +45,12 @@ class MeetingSearchResult:
 
     def get_meeting_details(self):
         details_downloader = MeetingDetailsDownloader(self)
-        return details_downloader.meeting_details.get_meeting_details()
+        return details_downloader.meeting_details
 
 
 class MeetingSearchDownloader:
     def __init__(self, meeting_date):
+        self.meeting_date = meeting_date
         self.meetings_search_page_data = self.__get_meetings_by_date(
             meeting_date)
 
@@ -43,49 +61,51 @@ class MeetingSearchDownloader:
         year_str = str(year)
         month_str = str(month).zfill(2)
         day_str = str(day).zfill(2)
-        meetings_page_response = requests.get(
-            MEETINGS_URL_BASE + "index.php?" + MEETINGS_PARAM_BASE + "&u_day=" + year_str + month_str + day_str)
-        return BeautifulSoup(meetings_page_response.content, "html.parser")
+        # 取得できなかった日を「会議なし」として記録しないよう、200以外は PageFetchError にする
+        # その日が終わる前に取得した検索ページはキャッシュから返さず再検証する
+        meetings_page_content = get_page_content(
+            MEETINGS_URL_BASE + "index.php?" + MEETINGS_PARAM_BASE + "&u_day=" + year_str + month_str + day_str,
+            page_date=self.meeting_date)
+        return parse_html(meetings_page_content, parse_only=MEETING_SEARCH_RESULTS_STRAINER)
 
     def get_meeting_search_results(self) -> list[MeetingSearchResult]:
         search_results = self.meetings_search_page_data.select(
             'td[class="s14_24"] a')
-        return [MeetingSearchResult(result_elm) for result_elm in search_results]
+        return [MeetingSearchResult(result_elm, self.meeting_date) for result_elm in search_results]
 
 
 class SpeakerTime:
+    # 氏名・属性・時間の文字列は speaker_parser で収集全体をまとめて解析する
+    __slots__ = ('name_attr', 'time_text')
+
     def __init__(self, speaker_time: dict):
-        self.name = self.__get_name(speaker_time["name"])
-        self.attributes = self.__get_speaker_attributes(speaker_time["name"])
-        self.speak_time = self.__get_speak_time(speaker_time["time"])
-
-    def __get_name(self, speaker_name_attr: str):
-        return re.sub("\(.+?\)", "", speaker_name_attr)
-
-    def __get_speaker_attributes(self, speaker_name_attr: str):
-        attributes_str = re.search(
-            "(?<=\().+?(?=\))", speaker_name_attr).group()
-        return attributes_str.split('・')
-
-    def __get_speak_time(self, speak_time: str):
-        hour_min_text_list = speak_time.split()
-        # 表記はn時間 n分とn分だけなので
-        if (len(hour_min_text_list) > 1):
-            hours_text = hour_min_text_list[0]
-            hours = int(re.sub(r"\D", "", hours_text))
-            min_text = hour_min_text_list[1]
-            minutes = int(re.sub(r"\D", "", min_text))
-            return timedelta(hours=hours, minutes=minutes)
-        else:
-            min_text = hour_min_text_list[0]
-            minutes = int(re.sub(r"\D", "", min_text))
-            return timedelta(minutes=minutes)
+        self.name_attr = speaker_time["name"]
+        self.time_text = speaker_time["time"]
+
+
+class GovernmentSpeakerTime:
+    __slots__ = ('name', 'start_at', 'time')
+
+    def __init__(self, speaker_time: dict):
+        self.name = speaker_time["name"]
+        self.start_at = speaker_time["start_at"]
+        self.time = speaker_time["time"]
 
 
 class MeetingDetails:
-    def __init__(self, topics: list[str], speaker_time: list[SpeakerTime]):
+    __slots__ = ('topics', 'speaker_time', 'ministers', 'responders')
+
+    def __init__(self, topics: list[str], speaker_time: list[SpeakerTime], ministers: list[GovernmentSpeakerTime],
+                 responders: list[GovernmentSpeakerTime]):
         self.topics = topics
         self.speaker_time = speaker_time
+        self.ministers = ministers
+        self.responders = responders
+
+
+# 発言時間の表で、以降の行を大臣等・答弁者等に切り替える見出し
+MINISTERS_HEADER_TEXT = "大臣等（建制順）："
+RESPONDERS_HEADER_TEXT = "答弁者等"
 
 
 class MeetingDetailsPage:
@@ -101,7 +121,8 @@ class MeetingDetailsPage:
 
         self.rows_speakers_time_table_with_responder_ministers = self.__get_rows(
             self.speakers_time_table_with_responder_ministers)
-        self.speaker_time_list = self.__parse_speaker_time_table_rows()
+        self.speaker_time_list, self.minister_time_list, self.responder_time_list =\
+            self.__parse_speaker_time_table_rows()
 
     def __get_tables(self):
         tables = self.meeting_details_page_data.select(
@@ -126,74 +147,91 @@ class MeetingDetailsPage:
         title_eliminated = self.rows_topics[1:-1]
         return [topic_row.text.strip() for topic_row in title_eliminated]
 
-    def __get_responder_header_tr(self):
-        responders_header_elm = self.speakers_time_table_with_responder_ministers.find(
-            text="答弁者等")
-        if (responders_header_elm):
-            return responders_header_elm.parent.parent
-
-    def __get_ministers_header_tr(self):
-        ministers_header_elm = self.speakers_time_table_with_responder_ministers.find(
-            text="大臣等（建制順）：")
-        if ministers_header_elm:
-            return ministers_header_elm.parent.parent.parent
-
-    def __parse_speaker_time_table_rows(self):
-        title_eliminated = self.rows_speakers_time_table_with_responder_ministers[1:]
-
-        ministers_header_elm = self.__get_ministers_header_tr()
-        responders_header_elm = self.__get_responder_header_tr()
-
-        if (ministers_header_elm):
-            minister_header_index = title_eliminated.index(
-                ministers_header_elm)
-            title_eliminated = title_eliminated[:minister_header_index]
-
-        if (responders_header_elm):
-            responder_header_index = title_eliminated.index(
-                responders_header_elm)
-            title_eliminated = title_eliminated[:responder_header_index]
-
+    def __get_header_tr(self, header_text: str):
+        header_elm = self.speakers_time_table_with_responder_ministers.find(
+            string=header_text)
+        if (header_elm):
+            return header_elm.find_parent('tr')
+
+    def __parse_speaker_time_table_rows(self) -> tuple[list[dict], list[dict], list[dict]]:
+        # 前から一度だけ走査し、見出し行で 議員 → 大臣等 → 答弁者等 と区分を切り替える
+        # 見出し行は同一の要素かどうかで判定する
+        ministers_header_tr = self.__get_header_tr(MINISTERS_HEADER_TEXT)
+        responders_header_tr = self.__get_header_tr(RESPONDERS_HEADER_TEXT)
+
+        speakers_list = []
+        ministers_list = []
+        responders_list = []
+        current_list = speakers_list
+        for speaker_time in self.rows_speakers_time_table_with_responder_ministers[1:]:
+            if (speaker_time is ministers_header_tr):
+                current_list = ministers_list
+                continue
+            if (speaker_time is responders_header_tr):
+                current_list = responders_list
+                continue
+            speaker_time_dict = self.__parse_speaker_time_row(speaker_time)
+            if (speaker_time_dict):
+                current_list.append(speaker_time_dict)
+
+        return (speakers_list, ministers_list, responders_list)
+
+    def __parse_speaker_time_row(self, speaker_time) -> dict | None:
+        name_elm = speaker_time.find('td', width="380")
         # trが空行とかいうキチガイ実装への対応
-        if (title_eliminated[-1].select_one('td[width="380"]') is None):
-            title_eliminated = title_eliminated[:-1]
-
-        speakers_list = [
-            {
-                "name": speaker_time.select_one('td[width="380"]').text.strip(),
-                "start_at": speaker_time.select('td[width="100"]')[0].text.strip(),
-                "time": speaker_time.select('td[width="100"]')[1].text.strip()
-            } for speaker_time in title_eliminated]
-
-        return speakers_list
+        if (name_elm is None):
+            return None
+        time_elms = speaker_time.find_all('td', width="100", limit=2)
+        if (len(time_elms) < 2):
+            return None
+        return {
+            "name": name_elm.text.strip(),
+            "start_at": time_elms[0].text.strip(),
+            "time": time_elms[1].text.strip()
+        }
 
     def get_meeting_details(self) -> MeetingDetails:
         speaker_times = [SpeakerTime(speaker_time_dict)
                          for speaker_time_dict in self.speaker_time_list]
-        return MeetingDetails(self.topics_list, speaker_times)
+        minister_times = [GovernmentSpeakerTime(minister_time_dict)
+                          for minister_time_dict in self.minister_time_list]
+        responder_times = [GovernmentSpeakerTime(responder_time_dict)
+                           for responder_time_dict in self.responder_time_list]
+        return MeetingDetails(self.topics_list, speaker_times, minister_times, responder_times)
+
+
+# 取得はスレッドでバイト列を取るだけにし、解析はプロセスで行うので
+# 解析の関数はモジュールの直下に置き、BeautifulSoupを含まない結果を返す
+def fetch_page_content(url: str, page_date: date | None = None) -> bytes:
+    return get_page_content(url, page_date=page_date)
+
+
+def parse_meeting_details_page(url: str, content: bytes) -> MeetingDetails:
+    meeting_details_page_data = parse_html(content, parse_only=MEETING_DETAILS_STRAINER)
+    return MeetingDetailsPage(meeting_details_page_data).get_meeting_details()
 
 
 class MeetingDetailsDownloader:
     def __init__(self, meeting_search_result: MeetingSearchResult):
-        self.__meeting_details_page_data = self.__get_meeting_details_page(
-            meeting_search_result.meeting_detail_url)
-        self.meeting_details = MeetingDetailsPage(
-            self.__meeting_details_page_data)
+        meeting_detail_url = meeting_search_result.meeting_detail_url
+        self.meeting_details = parse_meeting_details_page(
+            meeting_detail_url, fetch_page_content(meeting_detail_url, meeting_search_result.meeting_date))
 
-    def __get_meeting_details_page(self, meeting_detail_url: str) -> BeautifulSoup:
-        meeting_details_page_response = requests.get(meeting_detail_url)
-        return BeautifulSoup(meeting_details_page_response.content, "html.parser")
+
+# 発言一覧と大臣・答弁者一覧の列
+MEETING_ROW_COLUMNS = ["meeting_name", "date", "name_attr", "time_text", "topics"]
+MEETING_INTERNED_COLUMNS = ["meeting_name", "name_attr", "topics"]
+GOVERNMENT_ROW_COLUMNS = ["meeting_name", "date", "role", "name", "start_at", "time"]
+GOVERNMENT_INTERNED_COLUMNS = ["meeting_name", "role", "name"]
 
 
 class MeetingInfo:
+    __slots__ = ('meeting_date', 'meeting_summary', 'meeting_details')
+
     def __init__(self, meeting_date: date, meeting_summary: MeetingSearchResult, meeting_details: MeetingDetails):
         self.meeting_date = meeting_date
         self.meeting_summary = meeting_summary
         self.meeting_details = meeting_details
-        self.meeting_info_dict = {
-            "meeting_summary": self.summary_dict(),
-            "meeting_details": self.details_dict()
-        }
 
     def summary_dict(self):
         return {
@@ -205,25 +243,40 @@ class MeetingInfo:
         return {
             "topics": self.meeting_details.topics,
             "speakers": [{
+                "name": speaker_time.name_attr,
+                "time": speaker_time.time_text
+            } for speaker_time in self.meeting_details.speaker_time],
+            "ministers": [{
                 "name": speaker_time.name,
-                "attributes": speaker_time.attributes,
-                "time": str(int(speaker_time.speak_time.seconds / 60)) + "分"
-            } for speaker_time in self.meeting_details.speaker_time]
+                "start_at": speaker_time.start_at,
+                "time": speaker_time.time
+            } for speaker_time in self.meeting_details.ministers],
+            "responders": [{
+                "name": speaker_time.name,
+                "start_at": speaker_time.start_at,
+                "time": speaker_time.time
+            } for speaker_time in self.meeting_details.responders]
         }
 
+    def get_rows(self) -> list[tuple]:
+        # MEETING_ROW_COLUMNS の順
+        topics = ",".join(self.meeting_details.topics)
+        return [(self.meeting_summary.meeting_name, self.meeting_date, speaker_time.name_attr, speaker_time.time_text, topics)
+                for speaker_time in self.meeting_details.speaker_time]
+
+    def get_government_rows(self) -> list[tuple]:
+        # GOVERNMENT_ROW_COLUMNS の順
+        return [(self.meeting_summary.meeting_name, self.meeting_date, role, speaker_time.name, speaker_time.start_at,
+                 speaker_time.time)
+                for role, speaker_times in (("minister", self.meeting_details.ministers),
+                                            ("responder", self.meeting_details.responders))
+                for speaker_time in speaker_times]
+
     def to_row_dict(self):
-        info_dict_list = []
-        for speaker_time in self.meeting_details.speaker_time:
-            row = {
-                "meeting_name": self.meeting_summary.meeting_name,
-                "date": self.meeting_date,
-                "name": speaker_time.name,
-                "attributes": ", ".join(speaker_time.attributes),
-                "time_min": int(speaker_time.speak_time.seconds / 60),
-                "topics": ",".join(self.meeting_details.topics)
-            }
-            info_dict_list.append(row)
-        return info_dict_list
+        return [dict(zip(MEETING_ROW_COLUMNS, row)) for row in self.get_rows()]
+
+    def to_government_row_dict(self):
+        return [dict(zip(GOVERNMENT_ROW_COLUMNS, row)) for row in self.get_government_rows()]
 
 
 class MeetingDownloader:
@@ -234,41 +287,153 @@ class MeetingDownloader:
                                             for meeting_summary in meeting_search_results]
 
 
+class MeetingDayRows:
+    # 1日分の発言一覧と大臣・答弁者一覧の行 (それぞれ *_ROW_COLUMNS の順のタプル)
+    __slots__ = ('meeting_date', 'meeting_rows', 'government_rows')
+
+    def __init__(self, meeting_date: date, meeting_rows: list[tuple], government_rows: list[tuple]):
+        self.meeting_date = meeting_date
+        self.meeting_rows = meeting_rows
+        self.government_rows = government_rows
+
+
 class MeetingsDownloader:
-    def __init__(self, meeting_start_date, meeting_end_date):
+    def __init__(self, meeting_start_date, meeting_end_date, max_workers=SHUGIIN_MAX_WORKERS, pipelined=SHUGIIN_PIPELINED,
+                 checkpoint: CrawlCheckpoint | None = None, government_checkpoint: CrawlCheckpoint | None = None,
+                 stream=False):
         self.meeting_start_date = meeting_start_date
         self.meeting_end_date = meeting_end_date
-        self.meetings = {}
-        self.meetings_row_dict_list = []
+        self.max_workers = max_workers
+        self.pipelined = pipelined
+        self.checkpoint = checkpoint
+        self.government_checkpoint = government_checkpoint
+        # 記録先が無い場合はすべての行を、ある場合は記録しなかった当日以降の行だけを溜める
+        self.meeting_rows = ColumnarBuilder(MEETING_ROW_COLUMNS, MEETING_INTERNED_COLUMNS)
+        self.government_rows = ColumnarBuilder(GOVERNMENT_ROW_COLUMNS, GOVERNMENT_INTERNED_COLUMNS)
+        # streamの場合は取得せず、iter_row_batches か write_rows で少しずつ受け取る
+        if (stream):
+            return
         self.download()
-        self.meetings_df = pd.DataFrame(self.meetings_row_dict_list)
+        self.meetings_df = parse_shugiin_speakers(self.__get_rows_df(self.checkpoint, self.meeting_rows))
+        self.government_speakers_df = parse_government_speakers(
+            self.__get_rows_df(self.government_checkpoint, self.government_rows))
 
     def download(self):
-        for i in range((self.meeting_end_date - self.meeting_start_date).days+1):
-            meeting_date = self.meeting_start_date + timedelta(days=i)
-            print(
-                f"{meeting_date.year}年{meeting_date.month}月{meeting_date.day}日の情報を取得中")
-            meeting_info = MeetingDownloader(meeting_date).meetings
-
-            self.__set_meetings_info(meeting_date, meeting_info)
-            self.__set_meetings_row_dict_list(meeting_info)
+        for meeting_day_rows in self.iter_row_batches():
+            if (not self.__is_committed(self.checkpoint, meeting_day_rows.meeting_date)):
+                self.meeting_rows.extend(meeting_day_rows.meeting_rows)
+            if (not self.__is_committed(self.government_checkpoint, meeting_day_rows.meeting_date)):
+                self.government_rows.extend(meeting_day_rows.government_rows)
+
+    def iter_row_batches(self):
+        # 日付順に、1日分の行を取得し終えるたびに返す。記録先がある場合は返す前に記録する
+        for meeting_date, meeting_info in self.__iter_meeting_days(self.__get_meeting_dates()):
+            # 大臣等の行を先に記録する。途中で落ちてもその日は取り直され、記録済みのキーは無視される
+            government_rows = self.__commit_rows(
+                self.government_checkpoint, meeting_date,
+                [row for meeting in meeting_info for row in meeting.get_government_rows()], GOVERNMENT_ROW_COLUMNS)
+            meeting_rows = self.__commit_rows(
+                self.checkpoint, meeting_date,
+                [row for meeting in meeting_info for row in meeting.get_rows()], MEETING_ROW_COLUMNS)
+            yield MeetingDayRows(meeting_date, meeting_rows, government_rows)
+
+    def write_rows(self, meeting_sink: ChunkedCsvSink, government_sink: ChunkedCsvSink):
+        # 前回までに記録した行を書き出してから、取得した日の行を順に書き出す
+        for checkpoint, sink in ((self.checkpoint, meeting_sink), (self.government_checkpoint, government_sink)):
+            if (checkpoint):
+                for rows_df in checkpoint.iter_rows():
+                    sink.write_df(rows_df)
+        for meeting_day_rows in self.iter_row_batches():
+            meeting_sink.write_rows(meeting_day_rows.meeting_rows)
+            government_sink.write_rows(meeting_day_rows.government_rows)
+
+    def __iter_meeting_days(self, meeting_dates: list[date]):
+        if (self.max_workers > 1 and self.pipelined):
+            return self.__download_pipelined(meeting_dates)
+        elif (self.max_workers > 1):
+            return self.__download_concurrently(meeting_dates)
+        else:
+            return self.__download_serially(meeting_dates)
+
+    def __get_meeting_dates(self) -> list[date]:
+        meeting_dates = [self.meeting_start_date + timedelta(days=i)
+                         for i in range((self.meeting_end_date - self.meeting_start_date).days+1)]
+        if (self.checkpoint is None):
+            return meeting_dates
+        # 記録済みでない日だけを取得する
+        return [meeting_date for meeting_date in meeting_dates
+                if not self.checkpoint.is_completed(meeting_date.isoformat())]
+
+    def __get_rows_df(self, checkpoint: CrawlCheckpoint | None, rows: ColumnarBuilder) -> pd.DataFrame:
+        if (checkpoint is None):
+            return rows.to_df()
+        # 記録済みの行に、今回記録しなかった当日以降の行を加える
+        return pd.concat([checkpoint.load_rows(), rows.to_df()], ignore_index=True)
+
+    def __download_meeting_info(self, meeting_date: date) -> list[MeetingInfo]:
+        print(
+            f"{meeting_date.year}年{meeting_date.month}月{meeting_date.day}日の情報を取得中")
+        return MeetingDownloader(meeting_date).meetings
+
+    def __download_serially(self, meeting_dates: list[date]):
+        for meeting_date in meeting_dates:
+            meeting_info = self.__download_meeting_info(meeting_date)
+
+            yield (meeting_date, meeting_info)
 
             sleep(0.1)
 
-    def __set_meetings_info(self, meeting_date: date, meeting_info: list[MeetingInfo]):
-        self.meetings_row_dicts = [meeting.to_row_dict()
-                                   for meeting in meeting_info]
-        self.meetings[meeting_date] = meeting_info
+    def __download_concurrently(self, meeting_dates: list[date]):
+        # 入力順に結果を返すので、行の並びは逐次取得と同じになる
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            meeting_info_list = bounded_map(
+                executor, self.__download_meeting_info, meeting_dates, SHUGIIN_PREFETCH_DAYS)
+            yield from zip(meeting_dates, meeting_info_list)
 
-    def __set_meetings_row_dict_list(self, meeting_info: list[MeetingInfo]):
-        for meeting in meeting_info:
-            for row_dict in meeting.to_row_dict():
-                self.meetings_row_dict_list.append(row_dict)
+    def __enqueue_meeting_details(self, meeting_date: date, details_pipeline: FetchParsePipeline) -> list[tuple]:
+        print(
+            f"{meeting_date.year}年{meeting_date.month}月{meeting_date.day}日の情報を取得中")
+        search_results_downloader = MeetingSearchDownloader(meeting_date)
+        meeting_search_results = search_results_downloader.get_meeting_search_results()
+        return [(meeting_summary, details_pipeline.submit(
+                    partial(fetch_page_content, page_date=meeting_date), parse_meeting_details_page,
+                    meeting_summary.meeting_detail_url))
+                for meeting_summary in meeting_search_results]
+
+    def __download_pipelined(self, meeting_dates: list[date]):
+        # 検索ページから見つかった詳細ページを共有の作業キューに積み、
+        # 他の日の検索ページを読み込んでいる間にも詳細ページを並列に取得する
+        # 詳細ページの解析はプロセスで行い、取得済みで未解析のページが溜まりすぎたら検索を待たせる
+        with FetchParsePipeline(fetch_workers=self.max_workers) as details_pipeline,\
+                ThreadPoolExecutor(max_workers=self.max_workers) as search_executor:
+            search_results_list = bounded_map(
+                search_executor, lambda meeting_date: self.__enqueue_meeting_details(meeting_date, details_pipeline),
+                meeting_dates, SHUGIIN_PREFETCH_DAYS)
+            for meeting_date, search_results in zip(meeting_dates, search_results_list):
+                meeting_info = [MeetingInfo(meeting_date, meeting_summary, details_future.result())
+                                for meeting_summary, details_future in search_results]
+                yield (meeting_date, meeting_info)
+
+    def __is_committed(self, checkpoint: CrawlCheckpoint | None, meeting_date: date) -> bool:
+        # 当日以降のページはまだ更新されうるので記録しない
+        return checkpoint is not None and meeting_date < date.today()
+
+    def __commit_rows(self, checkpoint: CrawlCheckpoint | None, meeting_date: date, rows: list[tuple],
+                      columns: list[str]) -> list[tuple]:
+        if (not self.__is_committed(checkpoint, meeting_date)):
+            return rows
+        # 前回までに記録済みの日は、記録済みの行と重複しないよう行を返さない
+        if (checkpoint.is_completed(meeting_date.isoformat())):
+            return []
+        checkpoint.commit(meeting_date.isoformat(), [dict(zip(columns, row)) for row in rows])
+        return rows
 
 
 # 衆議院議員
 
 class DietMember:
+    __slots__ = ('name_kanji', 'name_kana', 'party')
+
     def __init__(self, name_kanji, name_kana, party):
         self.name_kanji = name_kanji
         self.name_kana = name_kana
@@ -314,6 +479,10 @@ class DietMembersPage:
         return diet_member_list
 
 
+def parse_diet_members_page(url: str, content: bytes) -> list[DietMember]:
+    return DietMembersPage(parse_html(content)).diet_members
+
+
 class DietMemberDownloader:
     def __init__(self):
         self.URL_BASE = "https://www.shugiin.go.jp/internet/itdb_annai.nsf/html/statics/syu/"
@@ -323,30 +492,22 @@ class DietMemberDownloader:
         self.add_resigned_diet_members()
         self.diet_members_df = self.get_diet_members_df()
 
-    def download_page(self) -> list[DietMembersPage]:
-        diet_members_page_list = []
-        for i in range(1, 11):
-            url = self.URL_BASE + str(i) + self.PAGE_NAME
+    def download_page(self) -> list[list[DietMember]]:
+        urls = [self.URL_BASE + str(i) + self.PAGE_NAME for i in range(1, 11)]
+        for url in urls:
             print(url, "の情報を取得中")
-            diet_members_response = requests.get(url)
-            diet_members_bs4 = BeautifulSoup(
-                diet_members_response.content, "html.parser")
-            diet_members_page_list.append(DietMembersPage(diet_members_bs4))
-            sleep(0.1)
-        return diet_members_page_list
+        with FetchParsePipeline() as pipeline:
+            return list(pipeline.map(fetch_page_content, parse_diet_members_page, urls))
 
     def get_diet_members(self) -> list[DietMember]:
         diet_members_list = []
-        for diet_members_page in self.__diet_members_page_list:
-            diet_members_list.extend(diet_members_page.diet_members)
+        for diet_members in self.__diet_members_page_list:
+            diet_members_list.extend(diet_members)
         return diet_members_list
 
     def add_resigned_diet_members(self):
-        self.diet_members.append(DietMember(name_kanji="山田修路", name_kana="やまだ しゅうじ", party="自由民主党"))
-        self.diet_members.append(DietMember(name_kanji="山本太郎", name_kana="やまもと たろう", party="れいわ新選組"))
-        self.diet_members.append(DietMember(name_kanji="吉川赳", name_kana="よしかわ たける", party="自由民主党"))
-        self.diet_members.append(DietMember(name_kanji="藤末健三", name_kana="ふじすえ けんぞう", party="自由民主党"))
-        self.diet_members.append(DietMember(name_kanji="岸本周平", name_kana="きしもと しゅうへい", party="無所属"))
+        for name_kanji, name_kana, party in SHUGIIN_RESIGNED_MEMBERS:
+            self.diet_members.append(DietMember(name_kanji=name_kanji, name_kana=name_kana, party=party))
 
 
     def get_diet_members_df(self) -> pd.DataFrame:
@@ -1,9 +1,12 @@
 import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 from pprint import pprint
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-from config import MEETING_TERM
+from config import MEETING_TERM, SHUISHO_WINDOW_SIZE, SHUISHO_NOT_FOUND_LIMIT
+from http_client import get_page
+from html_parser import parse_html
 
 SHUGIIN_SHUISHO_URL_BASE = "https://www.shugiin.go.jp/internet/itdb_shitsumon.nsf/html/shitsumon/"
 SANGIIN_SHUISHO_URL = "https://www.sangiin.go.jp/japanese/joho1/kousei/syuisyo/"+str(MEETING_TERM)+"/syuisyo.htm"
@@ -11,6 +14,9 @@ SANGIIN_SHUISHO_URL = "https://www.sangiin.go.jp/japanese/joho1/kousei/syuisyo/"
 class PageNotFoundError(Exception):
     pass
 
+class QuestionDownloadError(Exception):
+    pass
+
 class ShugiinShuishoClient:
     def __init__(self):
         pass
@@ -20,23 +26,46 @@ class ShugiinShuishoClient:
         return pd.DataFrame(questions)
 
     def download_questions(self):
-        question_index = 1
+        # 質問番号を一定数先読みして並列に取得し、404が続いたところを終端とする
         questions = []
-        while(True):
-            try:
-                question_bs4 = self.download_question_page(question_index)
-            except:
-                break
-            question_dict = self.parse_question_page(question_bs4)
-            questions.append(question_dict)
-            question_index += 1
+        not_found_run = 0
+        next_question_index = 1
+        pending_pages = deque()
+        with ThreadPoolExecutor(max_workers=SHUISHO_WINDOW_SIZE) as executor:
+            while (not_found_run < SHUISHO_NOT_FOUND_LIMIT):
+                while (len(pending_pages) < SHUISHO_WINDOW_SIZE):
+                    pending_pages.append(executor.submit(self.download_question_page_or_none, next_question_index))
+                    next_question_index += 1
+                question_bs4 = pending_pages.popleft().result()
+                if (question_bs4 is None):
+                    not_found_run += 1
+                    continue
+                not_found_run = 0
+                question_dict = self.parse_question_page(question_bs4)
+                questions.append(question_dict)
+            for pending_page in pending_pages:
+                pending_page.cancel()
         return questions
 
+    def download_question_page_or_none(self, question_index: int):
+        try:
+            return self.download_question_page(question_index)
+        except PageNotFoundError:
+            return None
+
     def download_question_page(self, question_index: int):
-        shugiin_questions_response = requests.get(SHUGIIN_SHUISHO_URL_BASE+ str(MEETING_TERM)+ "{:03}.htm".format(question_index))
+        url = SHUGIIN_SHUISHO_URL_BASE + str(MEETING_TERM) + "{:03}.htm".format(question_index)
+        # 5xx・接続エラーは HttpClient が再試行するので、ここでは取り直さない
+        # 404は終端の判定に使い、それ以外の失敗は打ち切らずに例外にする
+        try:
+            shugiin_questions_response = get_page(url)
+        except requests.RequestException as e:
+            raise QuestionDownloadError(url) from e
         if (shugiin_questions_response.status_code == 404):
             raise PageNotFoundError
-        return BeautifulSoup(shugiin_questions_response.content, 'html.parser')
+        if (shugiin_questions_response.status_code != 200):
+            raise QuestionDownloadError(f'{url} ({shugiin_questions_response.status_code})')
+        return parse_html(shugiin_questions_response.content)
 
     def parse_question_page(self, question_bs4):
         question_content_rows = question_bs4.find_all('tr')
@@ -71,8 +100,8 @@ class SangiinShuishoClient:
         return pd.DataFrame(questions)
 
     def download_questions_page(self):
-        questions_response = requests.get(SANGIIN_SHUISHO_URL)
-        return BeautifulSoup(questions_response.content, 'html.parser')
+        questions_response = get_page(SANGIIN_SHUISHO_URL)
+        return parse_html(questions_response.content)
 
     def parse_questions_page(self, questions_bs4):
         question_list = []
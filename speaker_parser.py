@@ -0,0 +1,105 @@
+import re
+import numpy as np
+import pandas as pd
+
+# 収集した発言者の「氏名(属性・属性)」と発言時間の文字列を、収集全体の列としてまとめて解析する
+# 解析できなかった行は例外にせず rejected 列に理由を残す
+
+# 括弧ごと取り除いたものを氏名、最初の括弧の中を属性とする
+SPEAKER_PARENTHESES_PATTERN = re.compile(r"\(.+?\)")
+SPEAKER_ATTRIBUTES_PATTERN = re.compile(r"\((?P<attributes>.+?)\)")
+# 衆議院の表記は「n時間 n分」と「n分」
+SPEAK_TIME_PATTERN = re.compile(r"^(?:(?P<hours>\d+)時間)?\s*(?:(?P<minutes>\d+)分)?$")
+# 参議院は発言開始位置がリンクの「#秒」で入っている
+SPEAK_START_PATTERN = re.compile(r"^#?(?P<seconds>\d+(?:\.\d+)?)$")
+
+REJECTED_COLUMN = 'rejected'
+ATTRIBUTES_NOT_FOUND = '属性なし'
+TIME_MALFORMED = '時間の形式が不正'
+
+
+def parse_name_attributes(name_attr: pd.Series) -> tuple[pd.Series, pd.Series]:
+    name_attr = name_attr.fillna('').astype(str)
+    names = name_attr.str.replace(SPEAKER_PARENTHESES_PATTERN, '', regex=True)
+    attributes = name_attr.str.extract(SPEAKER_ATTRIBUTES_PATTERN)['attributes']
+    return (names, attributes)
+
+
+def parse_speak_minutes(time_text: pd.Series) -> pd.Series:
+    extracted = time_text.fillna('').astype(str).str.normalize('NFKC').str.strip().str.extract(SPEAK_TIME_PATTERN)
+    hours = pd.to_numeric(extracted['hours']).fillna(0)
+    minutes = pd.to_numeric(extracted['minutes']).fillna(0)
+    malformed = extracted['hours'].isna() & extracted['minutes'].isna()
+    return (hours * 60 + minutes).astype('Int64').mask(malformed)
+
+
+def parse_start_minutes(start_href: pd.Series) -> pd.Series:
+    extracted = start_href.fillna('').astype(str).str.strip().str.extract(SPEAK_START_PATTERN)
+    return (pd.to_numeric(extracted['seconds']) / 60).round()
+
+
+def get_rejected(reasons: list[tuple[pd.Series, str]], index: pd.Index) -> pd.Series:
+    rejected = pd.Series('', index=index)
+    for mask, reason in reasons:
+        rejected = rejected.mask(mask, rejected.where(rejected == '', rejected + ', ') + reason)
+    return rejected
+
+
+def replace_columns(df: pd.DataFrame, raw_columns: list[str], parsed_columns: dict) -> pd.DataFrame:
+    # 元の文字列の列があった位置に解析結果の列を入れる
+    position = df.columns.get_loc(raw_columns[0])
+    parsed_df = df.drop(columns=raw_columns)
+    for offset, (column, values) in enumerate(parsed_columns.items()):
+        parsed_df.insert(position + offset, column, values)
+    return parsed_df
+
+
+def parse_shugiin_speakers(df: pd.DataFrame, name_attr_column='name_attr', time_column='time_text') -> pd.DataFrame:
+    if (name_attr_column not in df.columns):
+        return df
+    names, attributes = parse_name_attributes(df[name_attr_column])
+    time_min = parse_speak_minutes(df[time_column])
+    rejected = get_rejected(
+        [(attributes.isna(), ATTRIBUTES_NOT_FOUND), (time_min.isna(), TIME_MALFORMED)], df.index)
+    parsed_df = replace_columns(df, [name_attr_column, time_column], {
+        "name": names,
+        "attributes": attributes.fillna('').str.replace('・', ', ', regex=False),
+        "time_min": time_min
+    })
+    parsed_df[REJECTED_COLUMN] = rejected
+    return parsed_df
+
+
+def parse_government_speakers(df: pd.DataFrame, name_column='name', time_column='time') -> pd.DataFrame:
+    # 大臣・答弁者も議員の行と同じく「氏名(役職)」を氏名と属性に分け、発言時間の文字列は残して分を加える
+    if (name_column not in df.columns):
+        return df
+    names, attributes = parse_name_attributes(df[name_column])
+    parsed_df = replace_columns(df, [name_column], {
+        "name": names,
+        "attributes": attributes.fillna('').str.replace('・', ', ', regex=False)
+    })
+    parsed_df["time_min"] = parse_speak_minutes(df[time_column])
+    return parsed_df
+
+
+def parse_sangiin_speakers(df: pd.DataFrame, name_attr_column='name_attr', start_column='start_href',
+                           duration_column='meeting_duration', meeting_column='meeting_url') -> pd.DataFrame:
+    if (name_attr_column not in df.columns):
+        return df
+    names, attributes = parse_name_attributes(df[name_attr_column])
+    # 発言時間は次の発言者の開始位置まで、最後の発言者は会議の終わりまで
+    start_min = parse_start_minutes(df[start_column])
+    is_last_speaker = df.groupby(meeting_column, sort=False).cumcount(ascending=False) == 0
+    next_start_min = start_min.groupby(df[meeting_column], sort=False).shift(-1)
+    end_min = pd.Series(np.where(is_last_speaker, df[duration_column], next_start_min), index=df.index)
+    time_min = (end_min - start_min).astype('Int64')
+    rejected = get_rejected(
+        [(attributes.isna(), ATTRIBUTES_NOT_FOUND), (time_min.isna(), TIME_MALFORMED)], df.index)
+    parsed_df = replace_columns(df, [name_attr_column, start_column], {
+        "name": names,
+        "attributes": attributes.fillna('').str.replace('\u3000', '、', regex=False).str.replace('、', ', ', regex=False),
+        "time_min": time_min
+    }).drop(columns=[duration_column])
+    parsed_df[REJECTED_COLUMN] = rejected
+    return parsed_df
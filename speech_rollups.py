@@ -0,0 +1,102 @@
+import sqlite3
+import pandas as pd
+
+# 発言時間の集計表
+# 院・日付・委員会・区分・発言者の組毎に発言数と発言時間 (分) を持ち、
+# 索引の speeches 表に行が入る・変わる・消えるたびに、トリガーでその差分だけを足し引きする
+# 議員別・政党別・委員会別・日別の合計は、発言の行ではなくこの表をまとめて返す
+
+# 集計の単位と、まとめる列 (式, 列名)。議員は照合用のキーでまとめ、名前は議員一覧の表記を優先する
+ROLLUP_DIMENSIONS = {
+    'member': [('speech_rollups.speaker_key', 'speaker_key'), ('members.party', 'party')],
+    'party': [('members.party', 'party')],
+    'committee': [('speech_rollups.committee', 'committee')],
+    'date': [('speech_rollups.date', 'date')]
+}
+MEMBER_NAME_COLUMN = ('COALESCE(MAX(members.name), MIN(speech_rollups.speaker))', 'speaker')
+
+
+class SpeechRollups:
+    def __init__(self, connection: sqlite3.Connection):
+        self.__connection = connection
+        self.__create_table()
+
+    def __create_table(self):
+        is_new = self.__connection.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'speech_rollups'").fetchone()[0] == 0
+        self.__connection.executescript(
+            '''CREATE TABLE IF NOT EXISTS speech_rollups (
+                house TEXT NOT NULL,
+                date TEXT NOT NULL,
+                committee TEXT NOT NULL,
+                role TEXT NOT NULL,
+                speaker_key TEXT NOT NULL,
+                speaker TEXT NOT NULL,
+                speeches INTEGER NOT NULL,
+                time_min INTEGER NOT NULL,
+                PRIMARY KEY (house, date, committee, role, speaker_key)
+            );
+            CREATE INDEX IF NOT EXISTS speech_rollups_speaker ON speech_rollups (house, speaker_key);'''
+            + self.__get_trigger_script())
+        if (is_new):
+            # 索引に既にある発言から作る
+            self.__connection.execute(
+                '''INSERT INTO speech_rollups (house, date, committee, role, speaker_key, speaker, speeches, time_min)
+                SELECT meetings.house, meetings.date, meetings.name, speeches.role, speeches.speaker_key,
+                    MIN(speeches.speaker), COUNT(*), COALESCE(SUM(speeches.time_min), 0)
+                FROM speeches JOIN meetings ON meetings.id = speeches.meeting_id
+                GROUP BY meetings.house, meetings.date, meetings.name, speeches.role, speeches.speaker_key''')
+        self.__connection.commit()
+
+    def __get_trigger_script(self) -> str:
+        add_new = '''
+                INSERT INTO speech_rollups (house, date, committee, role, speaker_key, speaker, speeches, time_min)
+                SELECT house, date, name, new.role, new.speaker_key, new.speaker, 1, COALESCE(new.time_min, 0)
+                FROM meetings WHERE id = new.meeting_id
+                ON CONFLICT (house, date, committee, role, speaker_key) DO UPDATE SET
+                    speeches = speeches + 1, time_min = time_min + excluded.time_min;'''
+        old_key = '''(house, date, committee) = (SELECT house, date, name FROM meetings WHERE id = old.meeting_id)
+                    AND role = old.role AND speaker_key = old.speaker_key'''
+        subtract_old = f'''
+                UPDATE speech_rollups SET speeches = speeches - 1, time_min = time_min - COALESCE(old.time_min, 0)
+                WHERE {old_key};
+                DELETE FROM speech_rollups WHERE {old_key} AND speeches = 0;'''
+        return f'''
+            CREATE TRIGGER IF NOT EXISTS speeches_rollup_insert AFTER INSERT ON speeches BEGIN{add_new}
+            END;
+            CREATE TRIGGER IF NOT EXISTS speeches_rollup_delete AFTER DELETE ON speeches BEGIN{subtract_old}
+            END;
+            CREATE TRIGGER IF NOT EXISTS speeches_rollup_update
+            AFTER UPDATE OF meeting_id, role, speaker_key, time_min ON speeches BEGIN{subtract_old}{add_new}
+            END;'''
+
+    def get_totals(self, by: str | list[str], house: str | None = None, date_from=None, date_to=None,
+                   role: str | None = 'member') -> pd.DataFrame:
+        # by は 'member' / 'party' / 'committee' / 'date' またはその組み合わせ。発言時間の多い順
+        dimensions = [by] if isinstance(by, str) else by
+        group_columns = [('speech_rollups.house', 'house')] + list(dict.fromkeys(
+            column for dimension in dimensions for column in ROLLUP_DIMENSIONS[dimension]))
+        select_columns = group_columns + ([MEMBER_NAME_COLUMN] if 'member' in dimensions else [])
+        conditions = []
+        params = []
+        for column, operator, value in [
+                ('speech_rollups.house', '=', house),
+                ('speech_rollups.role', '=', role),
+                ('speech_rollups.date', '>=', date_from),
+                ('speech_rollups.date', '<=', date_to)]:
+            if (value is not None):
+                conditions.append(f'{column} {operator} ?')
+                params.append(str(value))
+        # どの単位も院を分けて数える (同じ名前の議員が両院にいる場合)
+        select_list = ', '.join(f'{expression} AS {alias}' for expression, alias in select_columns)
+        group_list = ', '.join(expression for expression, _ in group_columns)
+        return pd.read_sql_query(
+            f'''SELECT {select_list},
+                    SUM(speech_rollups.speeches) AS speeches,
+                    SUM(speech_rollups.time_min) AS time_min
+                FROM speech_rollups
+                LEFT JOIN members ON members.house = speech_rollups.house AND members.name_key = speech_rollups.speaker_key
+                WHERE {' AND '.join(conditions) or '1'}
+                GROUP BY {group_list}
+                ORDER BY time_min DESC, {group_list}''',
+            self.__connection, params=params)